@@ -1,10 +1,23 @@
 import streamlit as st
-from utils.file_handler import save_uploaded_files
 from components.initialization import initialize_app_state, check_api_configuration
-from components.processor import initialize_processor, process_resumes
-from components.results import display_results
-from components.filter import filter_resumes_with_nlp
 import os
+import re
+from pathlib import Path
+
+@st.cache_data(show_spinner=False)
+def load_css():
+    """Read the app stylesheet once, stripping comments and extra whitespace"""
+    css = (Path(__file__).parent / "static" / "app.css").read_text(encoding="utf-8")
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    return re.sub(r'\s+', ' ', css).strip()
+
+@st.cache_data(show_spinner=False)
+def _cached_excel(rows, columns):
+    """Build the Excel export once for each distinct set of rows and columns"""
+    from utils.export import export_to_excel
+    import pandas as pd
+    
+    return export_to_excel(pd.DataFrame(rows, columns=list(columns)))
 
 # Initialize app state
 secrets_manager = initialize_app_state()
@@ -17,297 +30,11 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
-# Simple light theme CSS - no toggling, just forcing light mode
-st.markdown("""
-<style>
-    /* Force light mode for all Streamlit components */
-    .stApp, [data-testid="stAppViewContainer"], [data-testid="stHeader"], 
-    [data-testid="stToolbar"], [data-testid="stSidebar"], 
-    [data-testid="stSidebarUserContent"], .main .block-container {
-        background-color: white !important;
-        color: #262730 !important;
-    }
-    
-    /* Fix dark mode text colors */
-    body, p, div, h1, h2, h3, h4, h5, h6, span, li, a, button, 
-    input, textarea, label, td, th, tr, thead, tbody {
-        color: #262730 !important;
-    }
-    
-    /* Table and dataframe specific */
-    .stDataFrame, [data-testid="stTable"], table, tr, td, th {
-        color: #262730 !important;
-        background-color: white !important;
-        border-color: #E5E5E5 !important;
-    }
-    
-    /* File uploader specific */
-    [data-testid="stFileUploader"] {
-        background-color: #f0f2f6 !important;
-        color: #262730 !important;
-        border-color: #E5E5E5 !important;
-    }
-    
-    /* Input elements and controls */
-    input, textarea, [data-baseweb="input"], [data-baseweb="textarea"],
-    [data-baseweb="select"], .stTextInput > div > div > input, 
-    .stSelectbox > div > div > div {
-        background-color: white !important;
-        color: #262730 !important;
-        border-color: #CCCCCC !important;
-    }
-    
-    /* Button styling */
-    button, .stButton button {
-        background-color: #F0F2F6 !important;
-        color: #262730 !important;
-        border-color: #E0E0E0 !important;
-    }
-    
-    /* Forcefully override dark mode */
-    @media (prefers-color-scheme: dark) {
-        html {
-            color-scheme: light !important;
-        }
-        
-        body, .stApp {
-            background-color: white !important;
-        }
-        
-        /* Reset dark mode color for text */
-        * {
-            color: #262730 !important;
-        }
-    }
-    
-    /* Global styles */
-    body {
-        font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif;
-        background-color: #ffffff;
-        color: #333333;
-    }
-    
-    /* Main container */
-    .main-container {
-        max-width: 1000px;
-        margin: 0 auto;
-        padding: 2rem 1rem;
-    }
-    
-    /* Header styles */
-    .logo-container {
-        text-align: center;
-        margin-bottom: 0.5rem;
-    }
-    
-    .main-title {
-        text-align: center;
-        font-size: 2.5rem;
-        font-weight: 700;
-        margin-bottom: 0.25rem;
-        color: #1a1a1a;
-    }
-    
-    .subtitle {
-        text-align: center;
-        color: #666666;
-        font-size: 1rem;
-        margin-bottom: 2rem;
-    }
-    
-    /* Action labels (top non-functional elements) */
-    .action-labels {
-        display: flex;
-        justify-content: space-between;
-        margin-bottom: 2rem;
-        padding: 0 1rem;
-    }
-    
-    .label-item {
-        display: flex;
-        align-items: center;
-        padding: 0.75rem 1.5rem;
-        background-color: #fafafa;
-        border-radius: 50px;
-        font-weight: 500;
-        color: #333333;
-        box-shadow: 0 1px 2px rgba(0,0,0,0.05);
-    }
-    
-    .label-icon {
-        margin-right: 0.5rem;
-    }
-    
-    /* Upload section */
-    .upload-section {
-        border: 2px dashed #e0e0e0;
-        border-radius: 10px;
-        padding: 2.5rem;
-        margin-bottom: 1.5rem;
-        text-align: center;
-        background-color: #fafafa;
-    }
-    
-    .upload-icon {
-        font-size: 2rem;
-        margin-bottom: 1rem;
-        color: #888888;
-    }
-    
-    .upload-title {
-        font-size: 1.25rem;
-        font-weight: 600;
-        margin-bottom: 0.5rem;
-        color: #333333;
-    }
-    
-    .upload-subtitle {
-        color: #666666;
-        margin-bottom: 1rem;
-    }
-    
-    .file-types {
-        color: #888888;
-        font-size: 0.85rem;
-        margin-top: 0.5rem;
-    }
-    
-    /* Divider */
-    .divider {
-        display: flex;
-        align-items: center;
-        text-align: center;
-        margin: 1.5rem 0;
-        color: #888888;
-    }
-    
-    .divider::before,
-    .divider::after {
-        content: '';
-        flex: 1;
-        border-bottom: 1px solid #e0e0e0;
-    }
-    
-    .divider-text {
-        padding: 0 1rem;
-    }
-    
-    /* Filter input */
-    .filter-container {
-        margin-top: 1.5rem;
-        margin-bottom: 0.5rem;
-    }
-    
-    .filter-input {
-        border-radius: 8px;
-        border: 1px solid #e0e0e0;
-        padding: 0.75rem 1rem;
-        width: 100%;
-        font-size: 1rem;
-    }
-    
-    /* Results section */
-    .results-container {
-        margin-top: 2rem;
-    }
-    
-    .results-header-container {
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        margin-bottom: 1.5rem;
-        padding: 0;
-    }
-    
-    .results-title {
-        font-size: 2rem;
-        font-weight: 600;
-        margin: 0;
-        color: #1a1a1a;
-    }
-    
-    .data-table-container {
-        border: 1px solid #e0e0e0;
-        border-radius: 8px;
-        overflow: hidden;
-        margin-bottom: 2rem;
-        box-shadow: 0 1px 3px rgba(0,0,0,0.05);
-    }
-    
-    /* Hide Streamlit components */
-    #MainMenu, footer, header {
-        visibility: hidden;
-    }
-    
-    /* Override Streamlit styles */
-    .stApp {
-        max-width: 100%;
-    }
-    
-    .block-container {
-        max-width: 1000px;
-        padding-top: 1rem;
-        padding-right: 1rem;
-        padding-left: 1rem;
-        padding-bottom: 1rem;
-    }
-    
-    /* Make file uploader cleaner */
-    .stFileUploader > div > button {
-        display: none;
-    }
-    
-    .uploadedFile {
-        display: none;
-    }
-    
-    /* Input field styling */
-    .stTextInput > div > div {
-        background-color: white;
-        border-radius: 8px;
-    }
-    
-    /* Style the table */
-    .stDataFrame {
-        border: none !important;
-    }
-    
-    /* Fix for button styling */
-    .stButton > button {
-        border-radius: 4px;
-        font-weight: 500;
-    }
-    
-    /* Sample button and export button styles */
-    div[data-testid="stButton"] button {
-        height: 60px !important;
-        padding: 10px 30px !important;
-        font-size: 1rem !important;
-    }
-    
-    div[data-testid="stButton"] button[data-testid="stButton-export_btn"] {
-        background-color: rgba(144, 238, 144, 0.2) !important;
-        border: 1px solid rgba(144, 238, 144, 0.5) !important;
-        color: #2E8B57 !important;
-        transition: background-color 0.3s ease !important;
-    }
-    
-    div[data-testid="stButton"] button[data-testid="stButton-export_btn"]:hover {
-        background-color: rgba(144, 238, 144, 0.4) !important;
-    }
-    
-    /* Target specific Streamlit emotion cache classes */
-    .st-emotion-cache-1kyxreq, .st-emotion-cache-16txtl3, .st-emotion-cache-10trblm,
-    .st-emotion-cache-1gulkj5, .st-emotion-cache-1erivf3, .st-emotion-cache-1wbqy5,
-    .st-emotion-cache-16idsys, .st-emotion-cache-4z1n4l {
-        background-color: white !important;
-        color: #262730 !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Simple light theme CSS (static/app.css) - no toggling, just forcing light mode
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
 
 # Check if Gemini API is configured
-check_api_configuration()
+check_api_configuration(secrets_manager)
 
 # Main container
 st.markdown('<div class="main-container">', unsafe_allow_html=True)
@@ -361,6 +88,18 @@ query = st.text_input(
 col1, col2 = st.columns([1, 3])
 with col1:
     filter_button = st.button("⌕ Filter Resumes", key="filter_btn", help="Process and filter uploaded resumes")
+with col2:
+    batch_mode = st.checkbox(
+        "Batch mode (cheaper, up to 24h)",
+        key="batch_mode",
+        help="Send all resumes as one Gemini Batch API job at half the cost. Results can take up to 24 hours."
+    )
+    parallel_prompts = st.checkbox(
+        "Parallel prompts (faster per resume)",
+        key="parallel_prompts",
+        disabled=batch_mode,
+        help="Analyze each resume with three smaller prompts sent at the same time. Uses three times as many API calls."
+    )
 st.markdown('</div>', unsafe_allow_html=True)
 
 # Clear filtered results if query is cleared
@@ -369,13 +108,8 @@ if not query and 'filtered_matches' in st.session_state:
 
 # Process Files Logic
 if uploaded_files:
-    if 'pending_files' not in st.session_state:
-        st.session_state.pending_files = []
-    
     # Store references to files but don't process them yet
-    for file in uploaded_files:
-        if file.name not in st.session_state.pending_files:
-            st.session_state.pending_files.append(file.name)
+    st.session_state.pending_files.update(file.name for file in uploaded_files)
     
     # Show message about using filters
     if not query:
@@ -393,12 +127,7 @@ if sample_clicked:
             sample_files = [f for f in os.listdir(sample_dir) if f.endswith(('.pdf', '.docx', '.doc', '.txt'))]
             if sample_files:
                 # Add sample files to pending_files
-                if 'pending_files' not in st.session_state:
-                    st.session_state.pending_files = []
-                
-                for file in sample_files:
-                    if file not in st.session_state.pending_files:
-                        st.session_state.pending_files.append(file)
+                st.session_state.pending_files.update(sample_files)
                 
                 # Store sample file paths for later processing
                 st.session_state.sample_file_paths = [os.path.join(sample_dir, f) for f in sample_files]
@@ -413,12 +142,17 @@ if sample_clicked:
 
 # Apply filtering if requested
 if filter_button and query:
+    # Deferred so that Gemini and the file parsers only load once filtering is requested
+    from utils.file_handler import save_uploaded_files
+    from components.processor import initialize_processor, process_resumes, process_resumes_batch
+    from components.filter import filter_resumes_with_nlp
+    
     try:
         files_to_process = False
         file_paths = []
         
         # Check if we need to process uploaded files
-        if uploaded_files and 'pending_files' in st.session_state and st.session_state.pending_files:
+        if uploaded_files and st.session_state.pending_files:
             file_paths.extend(save_uploaded_files(uploaded_files))
             files_to_process = True
         
@@ -444,21 +178,27 @@ if filter_button and query:
                 }
                 
                 st.session_state.user_filters = user_filters
-                process_resumes(file_paths, user_filters, processor)
+                if batch_mode:
+                    process_resumes_batch(file_paths, user_filters, processor, query)
+                else:
+                    process_resumes(file_paths, user_filters, processor, decompose=parallel_prompts)
                 
                 # Mark files as processed
-                st.session_state.pending_files = []
+                st.session_state.pending_files.clear()
                 if 'processed_files' not in st.session_state:
                     st.session_state.processed_files = []
                 if uploaded_files:
                     st.session_state.processed_files.extend([file.name for file in uploaded_files])
         
         # Now apply filters if we have processed resumes
-        if 'matches' in st.session_state and st.session_state.matches:
+        if 'batch_job' in st.session_state:
+            st.info("The resumes are filtered once the Gemini batch job has finished.")
+        elif 'matches' in st.session_state and st.session_state.matches:
             with st.spinner("Filtering resumes..."):
-                processor = st.session_state.gemini_processor
+                processor = initialize_processor(secrets_manager)
                 filtered_results = filter_resumes_with_nlp(query, processor, st.session_state.matches)
                 st.session_state.filtered_matches = filtered_results
+                st.session_state.filtered_version += 1
                 
                 if filtered_results:
                     st.success(f"Found {len(filtered_results)} matching resumes")
@@ -469,8 +209,11 @@ if filter_button and query:
     except Exception as e:
         st.error(f"Error filtering resumes: {e}")
 
-# Results section with export button
-if 'filtered_matches' in st.session_state and st.session_state.filtered_matches:
+@st.fragment
+def results_fragment():
+    """Results table with export button, rerun on its own when its widgets change"""
+    from components.results import display_results
+    
     # Results container
     st.markdown('<div class="results-container">', unsafe_allow_html=True)
     
@@ -482,13 +225,7 @@ if 'filtered_matches' in st.session_state and st.session_state.filtered_matches:
     # Data table in its own container
     st.markdown('<div class="data-table-container">', unsafe_allow_html=True)
     
-    # Temporarily swap the matches with filtered matches for display
-    original_matches = st.session_state.matches
-    st.session_state.matches = st.session_state.filtered_matches
-    display_results()
-    
-    # Restore original matches
-    st.session_state.matches = original_matches
+    display_results(st.session_state.filtered_matches)
     st.markdown('</div>', unsafe_allow_html=True)
     st.markdown('</div>', unsafe_allow_html=True)
     
@@ -505,13 +242,14 @@ if 'filtered_matches' in st.session_state and st.session_state.filtered_matches:
         
         if data_to_export:
             try:
-                from utils.export import export_to_excel
-                import pandas as pd
-                
-                df = pd.DataFrame(data_to_export)
-                columns_to_export = st.session_state.display_columns if 'display_columns' in st.session_state else df.columns
+                if 'display_columns' in st.session_state:
+                    columns_to_export = tuple(st.session_state.display_columns)
+                else:
+                    columns_to_export = tuple(col for col in data_to_export[0] if not col.startswith('_'))
                 
-                excel_data = export_to_excel(df[columns_to_export])
+                # Only the exported columns are hashed for the cache key
+                rows = [{col: resume.get(col, "") for col in columns_to_export} for resume in data_to_export]
+                excel_data = _cached_excel(rows, columns_to_export)
                 
                 # Direct download without additional button
                 st.download_button(
@@ -526,7 +264,15 @@ if 'filtered_matches' in st.session_state and st.session_state.filtered_matches:
         else:
             st.warning("No resume data available to export. Please upload and filter resumes first.")
 
-elif query and filter_button and not st.session_state.get('filtered_matches', []):
+# Progress of a pending batch job, checked again while the page stays open
+if 'batch_job' in st.session_state:
+    from components.processor import initialize_processor, batch_job_fragment
+    batch_job_fragment(initialize_processor(secrets_manager))
+
+# Results section with export button
+if 'filtered_matches' in st.session_state and st.session_state.filtered_matches:
+    results_fragment()
+elif query and filter_button and not st.session_state.get('filtered_matches', []) and 'batch_job' not in st.session_state:
     # We tried filtering but didn't find any matches
     st.markdown('<div class="results-container">', unsafe_allow_html=True)
     st.warning(f"No resumes found matching '{query}'")
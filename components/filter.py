@@ -1,5 +1,40 @@
 import streamlit as st
 import json
+import re
+import zlib
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Resume count above which structured filtering is spread over a thread pool
+PARALLEL_FILTER_THRESHOLD = 256
+
+# Width in bits of the trigram signature used to prefilter resumes
+SIGNATURE_BITS = 2048
+
+# Word tokens used by the keyword fallback
+_TOKEN_RE = re.compile(r'[a-z0-9+#.]+')
+
+# Outermost JSON object / list in a Gemini response
+_JSON_OBJECT_RE = re.compile(r'\{.*\}', re.S)
+_JSON_LIST_RE = re.compile(r'\[.*\]', re.S)
+
+# Fields of the structured filters returned by process_nlp_query
+FILTER_FIELDS = ('skills', 'experience_years', 'education', 'job_titles', 'location', 'keywords')
+
+# Filter fields that are matched by searching the resume text for their terms
+TERM_CATEGORIES = ('skills', 'education', 'job_titles', 'location', 'keywords')
 
 def filter_resumes_with_nlp(query, processor, resumes):
     """
@@ -17,14 +52,33 @@ def filter_resumes_with_nlp(query, processor, resumes):
         return resumes
         
     try:
+        # Score all resumes against the query with batched Gemini calls
+        scored_resumes = _cached_resume_scores(query, resumes, processor)
+        if scored_resumes is not None:
+            return scored_resumes
+        
         # Use Gemini to create a filtering prompt
         filters = process_nlp_query(query, processor)
         
-        # Apply the filters to each resume
-        filtered_resumes = []
-        for resume in resumes:
-            if matches_filters(resume, filters):
-                filtered_resumes.append(resume)
+        # Every resume matches when Gemini found no criteria in the query
+        if not any(filters.get(key) for key in FILTER_FIELDS):
+            return resumes
+        
+        # Lowercase the filter terms once rather than for every resume
+        filters = _lowercase_filters(filters)
+        matcher = build_term_matcher(filters)
+        
+        # Skip resumes whose signature rules out the terms of a filter category
+        term_signatures = _category_term_signatures(filters)
+        candidates = [resume for resume in resumes if _may_match(resume, term_signatures)]
+        
+        # Apply the filters to each remaining resume
+        if len(candidates) > PARALLEL_FILTER_THRESHOLD:
+            with ThreadPoolExecutor() as executor:
+                mask = executor.map(lambda resume: matches_filters(resume, filters, matcher), candidates)
+                filtered_resumes = [resume for resume, matched in zip(candidates, mask) if matched]
+        else:
+            filtered_resumes = [resume for resume in candidates if matches_filters(resume, filters, matcher)]
         
         # If no matches, try basic keyword filtering as backup
         if not filtered_resumes:
@@ -38,6 +92,102 @@ def filter_resumes_with_nlp(query, processor, resumes):
         # Fallback to basic keyword filtering on errors
         return simple_keyword_filter(query, resumes)
 
+def _cached_resume_scores(query, resumes, processor):
+    """
+    Score resumes with batch_score_resumes, reusing the last result for the same query and resumes
+    
+    Args:
+        query (str): User's natural language query
+        resumes (list): List of resume data dictionaries
+        processor: The Gemini processor instance
+        
+    Returns:
+        list: Resumes scoring at least the threshold, best match first, or
+            None if scoring failed and structured filtering should be used
+    """
+    # The file paths tell apart different lists of resumes with the same version
+    key = (query.strip().lower(), st.session_state.get('matches_version', 0),
+           tuple(resume.get('file_path') or resume.get('filename') for resume in resumes))
+    cached = st.session_state.get('resume_scores')
+    if cached is None or cached[0] != key:
+        try:
+            scored_resumes = batch_score_resumes(query, resumes, processor)
+        except Exception as e:
+            st.warning(f"Could not score resumes with AI: {e}. Using structured filtering.")
+            return None
+        if scored_resumes is None:
+            return None
+        cached = (key, scored_resumes)
+        st.session_state.resume_scores = cached
+    return list(cached[1])
+
+def batch_score_resumes(query, resumes, processor, batch=20, threshold=0.5):
+    """
+    Score resumes against the query with one Gemini call per batch of resumes
+    
+    Args:
+        query (str): User's natural language query
+        processor: The Gemini processor instance
+        resumes (list): List of resume data dictionaries
+        batch (int): Number of resumes sent in each prompt
+        threshold (float): Minimum score for a resume to be kept
+        
+    Returns:
+        list: Resumes scoring at least the threshold, best match first,
+            or None if a response could not be parsed or left out a resume
+    """
+    scores = {}
+    
+    for start in range(0, len(resumes), batch):
+        resume_lines = []
+        for i, resume in enumerate(resumes[start:start+batch], start):
+            resume_lines.append(
+                f"[{i}] name={_prompt_field(resume, 'name')} "
+                f"skills={_prompt_field(resume, 'skills')} "
+                f"exp={_prompt_field(resume, 'experience')} "
+                f"education={_prompt_field(resume, 'education')} "
+                f"location={_prompt_field(resume, 'location')} "
+                f"work={_prompt_field(resume, 'work_history_summary')}"
+            )
+        resume_list = "\n".join(resume_lines)
+        
+        prompt = f"""
+    Score how well each resume below matches this search query: "{query}"
+    
+    Resumes:
+    {resume_list}
+    
+    Return a JSON list with one object per resume: [{{"id": int, "score": number between 0 and 1}}]
+    Use the number in square brackets as the id.
+    Do not include any text before or after the JSON.
+    """
+        
+        result = processor._call_gemini_with_retry(prompt)
+        
+        # Find the JSON list in the response
+        match = _JSON_LIST_RE.search(result)
+        if not match:
+            return None
+        
+        try:
+            for entry in _json_loads(match.group(0)):
+                scores[int(entry['id'])] = float(entry['score'])
+        except (ValueError, TypeError, KeyError):
+            return None
+        
+        # A resume missing from the response can't be ranked against the others
+        if any(i not in scores for i in range(start, min(start + batch, len(resumes)))):
+            return None
+    
+    ranked = sorted((i for i, score in scores.items()
+                     if 0 <= i < len(resumes) and score >= threshold),
+                    key=lambda i: -scores[i])
+    return [resumes[i] for i in ranked]
+
+def _prompt_field(resume, field, max_length=300):
+    """Format a resume field for a scoring prompt, trimmed to keep prompts small"""
+    return str(resume.get(field, '')).replace("\n", " ")[:max_length]
+
 def simple_keyword_filter(query, resumes):
     """
     Simple keyword-based resume filtering
@@ -49,38 +199,56 @@ def simple_keyword_filter(query, resumes):
     Returns:
         list: Filtered list of resume data dictionaries
     """
-    # Split the query into keywords
-    keywords = [kw.strip().lower() for kw in query.split() if len(kw.strip()) > 2]
+    # Split the query into keyword tokens
+    query_tokens = list(dict.fromkeys(split_tokens(query.lower())))
+    keywords = [kw for kw in query_tokens if len(kw) > 2]
     
     if not keywords:
         # If no valid keywords, try with shorter words too
-        keywords = [kw.strip().lower() for kw in query.split() if len(kw.strip()) > 0]
+        keywords = query_tokens
     
     if not keywords:
         return resumes  # Return all resumes if no keywords found
     
     st.info(f"Searching for keywords: {', '.join(keywords)}")
     
-    filtered_resumes = []
-    for resume in resumes:
-        resume_text = str(resume).lower()
-        
-        # Check if any keyword appears in the resume text
-        if any(keyword in resume_text for keyword in keywords):
-            filtered_resumes.append(resume)
+    keyword_set = frozenset(keywords)
+    return [resume for resume in resumes if keyword_set & _resume_tokens(resume)]
+
+def split_tokens(text):
+    """
+    Split lowercased text into word tokens, keeping tokens such as c++, c# and node.js
     
-    return filtered_resumes
+    Args:
+        text (str): Lowercased text
+        
+    Returns:
+        list: Tokens in order of appearance
+    """
+    return [token for token in (match.strip('.') for match in _TOKEN_RE.findall(text)) if token]
 
-def process_nlp_query(query, processor):
+def _resume_tokens(resume):
+    """Get the precomputed token set of a resume, building it if missing"""
+    tokens = resume.get('_tokens')
+    if tokens is None:
+        tokens = frozenset(split_tokens(resume.get('_search_blob') or str(resume).lower()))
+    return tokens
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _cached_nlp_filters(query, _processor):
     """
-    Process natural language query into structured filters using Gemini
+    Convert a normalized query into structured filters with Gemini, caching the result
     
     Args:
-        query (str): User's natural language query
-        processor: The Gemini processor instance
+        query (str): Normalized (stripped, lowercased) query, used as the cache key
+        _processor: The Gemini processor instance (excluded from the cache key)
         
     Returns:
         dict: Structured filters
+        
+    Raises:
+        ValueError: If no JSON object could be found in the response, so that
+            failed conversions are never cached
     """
     prompt = f"""
     Extract structured filtering criteria from this search query: "{query}"
@@ -100,29 +268,82 @@ def process_nlp_query(query, processor):
     """
     
     try:
-        result = processor._call_gemini_with_retry(prompt)
-        result = result.strip()
+        result = _read_json_stream(_processor.stream_call_gemini(prompt))
+    except Exception:
+        # Fall back to a regular call with retries if streaming fails
+        result = _processor._call_gemini_with_retry(prompt)
+    
+    # Extract just the JSON part of the response
+    match = _JSON_OBJECT_RE.search(result)
+    if match:
+        return _json_loads(match.group(0))
+    
+    raise ValueError("Could not extract valid JSON from AI response")
+
+def _read_json_stream(chunks):
+    """
+    Read a streamed response until its first JSON object is complete
+    
+    Quotes and backslash escapes are tracked so that braces inside JSON strings
+    (e.g. a skill named "C{}") are not counted. The stream is closed as soon as
+    the object ends, without waiting for the rest of the response.
+    
+    Args:
+        chunks: Generator of response text chunks
         
-        # Try to find JSON in the response by looking for opening/closing braces
-        json_start = result.find('{')
-        json_end = result.rfind('}')
+    Returns:
+        str: The text received up to the end of the JSON object, or the
+            whole response if no object was completed
+    """
+    received = []
+    depth = 0
+    in_string = escaped = False
+    with closing(chunks):
+        for chunk in chunks:
+            for i, char in enumerate(chunk):
+                if in_string:
+                    if escaped:
+                        escaped = False
+                    elif char == '\\':
+                        escaped = True
+                    elif char == '"':
+                        in_string = False
+                elif char == '"':
+                    in_string = depth > 0
+                elif char == '{':
+                    depth += 1
+                elif char == '}' and depth:
+                    depth -= 1
+                    if not depth:
+                        received.append(chunk[:i + 1])
+                        return "".join(received)
+            received.append(chunk)
+    return "".join(received)
+
+def process_nlp_query(query, processor):
+    """
+    Process natural language query into structured filters using Gemini
+    
+    Args:
+        query (str): User's natural language query
+        processor: The Gemini processor instance
         
-        if json_start >= 0 and json_end > json_start:
-            # Extract just the JSON part
-            json_str = result[json_start:json_end+1]
-            filters = json.loads(json_str)
-            return filters
-        else:
-            # Fallback to manual construction
-            st.warning("Could not extract valid JSON from AI response. Using basic filtering.")
-            return {
-                'skills': [kw.strip() for kw in query.split(",")],
-                'experience_years': 0,
-                'education': None,
-                'job_titles': [],
-                'location': None,
-                'keywords': [query]
-            }
+    Returns:
+        dict: Structured filters
+    """
+    try:
+        return _cached_nlp_filters(query.strip().lower(), processor)
+    except ValueError:
+        # Fallback to manual construction
+        st.warning("Could not extract valid JSON from AI response. Using basic filtering.")
+        return {
+            'skills': [kw.strip() for kw in query.split(",")],
+            'experience_years': 0,
+            'education': None,
+            'job_titles': [],
+            'location': None,
+            'keywords': [query]
+        }
     except Exception as e:
         st.warning(f"Could not process query with AI: {str(e)}. Using basic filtering.")
         # Fallback to simple keyword matching
@@ -135,22 +356,132 @@ def process_nlp_query(query, processor):
             'keywords': [query]
         }
 
-def matches_filters(resume, filters):
+def _lowercase_filters(filters):
+    """Return a copy of the filters with every string value and list item lowercased"""
+    return {
+        key: ([term.lower() if isinstance(term, str) else term for term in value] if isinstance(value, list)
+              else value.lower() if isinstance(value, str) else value)
+        for key, value in filters.items()
+    }
+
+def text_signature(text):
+    """
+    Fold the character trigrams of a text into a SIGNATURE_BITS-wide bit signature
+    
+    A term can only occur in a text if every bit set in the term's signature is
+    also set in the text's, so comparing signatures rules out non-matching
+    resumes without false negatives.
+    
+    Args:
+        text (str): Lowercased text
+        
+    Returns:
+        int: Bit signature of the text
+    """
+    trigrams = {text[i:i+3] for i in range(len(text) - 2)}
+    bits = {zlib.crc32(trigram.encode()) % SIGNATURE_BITS for trigram in trigrams}
+    return sum(1 << bit for bit in bits)
+
+def _category_term_signatures(filters):
+    """Map each filter category with text terms to the signatures of those terms"""
+    signatures = {}
+    for category in TERM_CATEGORIES:
+        terms = filters.get(category)
+        if not terms:
+            continue
+        if isinstance(terms, str):
+            terms = [terms]
+        signatures[category] = [text_signature(str(term)) for term in terms]
+    return signatures
+
+def _may_match(resume, term_signatures):
+    """Check whether every filter category could have a term present in the resume"""
+    signature = resume.get('_signature')
+    if signature is None:
+        return True
+    return all(any(term & signature == term for term in terms)
+               for terms in term_signatures.values())
+
+def build_term_matcher(filters):
+    """
+    Build a matcher that finds the terms of all filter categories in one pass
+    
+    Uses an Aho-Corasick automaton when pyahocorasick is installed, otherwise
+    one precompiled alternation regex per category.
+    
+    Args:
+        filters (dict): Structured filters with lowercased terms
+        
+    Returns:
+        Automaton mapping each lowercased term to the categories it belongs to,
+        a dict mapping each category to its compiled pattern, or None if the
+        filters have no terms
+    """
+    term_categories = {}
+    for category in TERM_CATEGORIES:
+        terms = filters.get(category)
+        if not terms:
+            continue
+        if isinstance(terms, str):
+            terms = [terms]
+        for term in terms:
+            term = str(term)
+            if term:
+                term_categories.setdefault(term, set()).add(category)
+    
+    if not term_categories:
+        return None
+    
+    if not AHOCORASICK_AVAILABLE:
+        category_terms = {}
+        for term, categories in term_categories.items():
+            for category in categories:
+                category_terms.setdefault(category, []).append(term)
+        return {category: re.compile('|'.join(map(re.escape, terms)))
+                for category, terms in category_terms.items()}
+    
+    automaton = ahocorasick.Automaton()
+    for term, categories in term_categories.items():
+        automaton.add_word(term, frozenset(categories))
+    automaton.make_automaton()
+    return automaton
+
+def _matched_categories(matcher, resume_text):
+    """Scan the resume text and return the categories with at least one hit"""
+    if isinstance(matcher, dict):
+        return {category for category, pattern in matcher.items() if pattern.search(resume_text)}
+    
+    hits = set()
+    for _, categories in matcher.iter(resume_text):
+        hits.update(categories)
+    return hits
+
+def _category_matches(category, terms, resume_text, hits):
+    """Check whether any term of a filter category appears in the resume text"""
+    if hits is not None:
+        return category in hits
+    if isinstance(terms, str):
+        terms = [terms]
+    return any(term in resume_text for term in terms)
+
+def matches_filters(resume, filters, matcher=None):
     """
     Check if a resume matches the given filters
     
     Args:
         resume (dict): Resume data
-        filters (dict): Structured filters
+        filters (dict): Structured filters with lowercased terms
+        matcher: Optional matcher from build_term_matcher for the same filters
         
     Returns:
         bool: True if the resume matches the filters
     """
-    resume_text = str(resume).lower()
+    resume_text = resume.get('_search_blob') or str(resume).lower()
+    hits = _matched_categories(matcher, resume_text) if matcher is not None else None
     
     # Skills matching
     if filters.get('skills'):
-        if not any(skill.lower() in resume_text for skill in filters['skills']):
+        if not _category_matches('skills', filters['skills'], resume_text, hits):
             return False
             
     # Experience matching
@@ -166,22 +497,22 @@ def matches_filters(resume, filters):
                 
     # Education matching
     if filters.get('education') and filters['education'] is not None:
-        if filters['education'].lower() not in resume_text:
+        if not _category_matches('education', filters['education'], resume_text, hits):
             return False
             
     # Job title matching
     if filters.get('job_titles'):
-        if not any(title.lower() in resume_text for title in filters['job_titles']):
+        if not _category_matches('job_titles', filters['job_titles'], resume_text, hits):
             return False
             
     # Location matching
     if filters.get('location') and filters['location'] is not None:
-        if filters['location'].lower() not in resume_text:
+        if not _category_matches('location', filters['location'], resume_text, hits):
             return False
         
     # Check for generic keywords
     if filters.get('keywords'):
-        if not any(keyword.lower() in resume_text for keyword in filters['keywords']):
+        if not _category_matches('keywords', filters['keywords'], resume_text, hits):
             return False
             
     return True
\ No newline at end of file
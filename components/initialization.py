@@ -1,35 +1,55 @@
 import streamlit as st
-from utils.secrets_manager import SecretsManager
+from importlib.util import find_spec
+from utils.secrets_manager import SecretsManager, get_secrets_manager
+from utils.session_store import new_session_key, load_matches, load_batch_job
 
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-    st.error("Google Generative AI package is not installed. Please run: pip install google-generativeai")
+def _is_gemini_installed():
+    """Check whether google-generativeai is installed without importing it"""
+    try:
+        return find_spec("google.generativeai") is not None
+    except ModuleNotFoundError:
+        return False
+
+# google.generativeai itself is only imported once a processor is created
+GEMINI_AVAILABLE = _is_gemini_installed()
 
 def initialize_app_state():
     """Initialize application state and return the secrets manager"""
-    secrets_manager = SecretsManager()
+    secrets_manager = get_secrets_manager()
     
     # Initialize session state variables if they don't exist
     if 'resume_data' not in st.session_state:
         st.session_state.resume_data = []
     if 'matches' not in st.session_state:
         st.session_state.matches = []
-    if 'gemini_processor' not in st.session_state:
-        st.session_state.gemini_processor = None
+    if 'session_key' not in st.session_state:
+        # Kept in the URL so that reloading the page restores the processed resumes
+        st.session_state.session_key = new_session_key(st.query_params.get('session'))
+        st.query_params['session'] = st.session_state.session_key
+        if not st.session_state.matches:
+            st.session_state.matches = load_matches(st.session_state.session_key)
+        # A batch job submitted before the reload is checked again
+        batch = load_batch_job(st.session_state.session_key)
+        if batch is not None:
+            st.session_state.batch_job = batch
+    if 'matches_version' not in st.session_state:
+        # Incremented whenever the resume data shown in the results changes
+        st.session_state.matches_version = 0
+    if 'filtered_version' not in st.session_state:
+        # Incremented whenever st.session_state.filtered_matches is assigned
+        st.session_state.filtered_version = 0
     if 'gemini_configured' not in st.session_state:
         if GEMINI_AVAILABLE:
             st.session_state.gemini_configured = secrets_manager.has_secrets(section='gemini')
         else:
             st.session_state.gemini_configured = False
-    if 'batch_size' not in st.session_state:
-        st.session_state.batch_size = 5
     if 'processing_files' not in st.session_state:
         st.session_state.processing_files = {}
     if 'processing_complete' not in st.session_state:
         st.session_state.processing_complete = False
+    if 'pending_files' not in st.session_state:
+        # Names of uploaded or sample files waiting to be processed
+        st.session_state.pending_files = set()
     if 'filter_query' not in st.session_state:
         st.session_state.filter_query = ""
     
@@ -63,8 +83,8 @@ def initialize_app_state():
     
     return secrets_manager
 
-def check_api_configuration():
-    """Check if the Gemini API key is properly configured"""
+def check_api_configuration(secrets_manager):
+    """Check if the Gemini API key is properly configured, offering to create a local secrets file"""
     if not GEMINI_AVAILABLE:
         st.error("Google Generative AI package is not installed. This application requires it for processing resumes.")
         st.info("Please install the package using: pip install google-generativeai")
@@ -73,6 +93,8 @@ def check_api_configuration():
     if not st.session_state.gemini_configured:
         st.warning("Gemini API key is not configured. The application requires this for resume processing.")
         st.info("Please add your Gemini API key in .streamlit/secrets.toml")
+        if secrets_manager.needs_local_setup and st.button("Create secrets.toml template"):
+            SecretsManager.prepare_local_secrets()
         return False
         
     return True
\ No newline at end of file
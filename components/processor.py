@@ -1,7 +1,115 @@
 import os
-import time
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from queue import Queue, Empty
 import streamlit as st
 from utils.gemini_processor import GeminiProcessor
+from utils.file_handler import get_texts_from_files, compact_text, split_text_into_sections
+from utils.session_store import save_matches, save_batch_job, clear_batch_job
+from components.filter import _cached_nlp_filters, split_tokens, text_signature, filter_resumes_with_nlp
+
+try:
+    import xxhash
+    
+    def _hash_bytes(data):
+        return xxhash.xxh3_64_hexdigest(data)
+except ImportError:
+    import hashlib
+    
+    def _hash_bytes(data):
+        return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+# Seconds between checks of a pending Gemini batch job
+BATCH_POLL_INTERVAL = 30
+
+# Number of parsed resumes kept for reuse across sessions
+PARSED_RESUME_CACHE_SIZE = 256
+
+# Fields rebuilt from the parsed data, left out of the parsed resume cache to save memory
+DERIVED_FIELDS = ('_search_blob', '_tokens', '_signature', '_compact_text', '_sections')
+
+# Resume fields that the natural language and keyword filters search through
+SEARCH_FIELDS = ('name', 'skills', 'experience', 'education', 'location',
+                 'work_history_summary', 'languages', 'certifications')
+
+def build_search_blob(resume):
+    """
+    Build the lowercased text that the filters search for a parsed resume
+    
+    Args:
+        resume: Dictionary of extracted resume data
+        
+    Returns:
+        str: Lowercased concatenation of the searchable fields
+    """
+    return ' '.join(str(resume.get(field, '')) for field in SEARCH_FIELDS).lower()
+
+class ParsedResumeCache:
+    """Least recently used cache of parsed resumes, shared by every session"""
+    
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get(self, key):
+        """
+        Look up a parsed resume
+        
+        Args:
+            key: (file content hash, filters key)
+            
+        Returns:
+            dict: Copy of the parsed resume data without the derived fields, or None
+        """
+        with self.lock:
+            data = self.entries.get(key)
+            if data is None:
+                return None
+            self.entries.move_to_end(key)
+            return dict(data)
+    
+    def put(self, key, data):
+        """
+        Store a parsed resume, evicting the least recently used one when full
+        
+        Args:
+            key: (file content hash, filters key)
+            data: Dictionary of extracted resume data
+        """
+        data = {field: value for field, value in data.items() if field not in DERIVED_FIELDS}
+        with self.lock:
+            self.entries[key] = data
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+@st.cache_resource(show_spinner=False)
+def _parsed_resume_cache():
+    """
+    Process-wide cache of parsed resumes
+    
+    Returns:
+        ParsedResumeCache: Maps (file content hash, filters key) to the parsed resume data
+    """
+    return ParsedResumeCache(PARSED_RESUME_CACHE_SIZE)
+
+@st.cache_resource(show_spinner=False)
+def _get_processor(api_key):
+    """
+    Create a Gemini processor shared by every session that uses the same API key
+    
+    Args:
+        api_key: Gemini API key, used as the cache key
+        
+    Returns:
+        GeminiProcessor: Shared processor instance
+    """
+    # Cached query filters were produced with the previous API key
+    _cached_nlp_filters.clear()
+    return GeminiProcessor(api_key)
 
 def initialize_processor(secrets_manager):
     """
@@ -13,35 +121,32 @@ def initialize_processor(secrets_manager):
     Returns:
         GeminiProcessor: Initialized processor instance
     """
-    if st.session_state.gemini_processor is None:
-        if st.session_state.gemini_configured:
-            try:
-                gemini_api_key = secrets_manager.get_secret('api_key', section='gemini')
-                st.session_state.gemini_processor = GeminiProcessor(gemini_api_key)
-            except Exception as e:
-                st.warning(f"Error initializing Google Gemini: {e}")
-                st.session_state.gemini_processor = GeminiProcessor("dummy_key")
-        else:
-            st.warning("Google Gemini API key is not configured in .streamlit/secrets.toml")
-            st.session_state.gemini_processor = GeminiProcessor("dummy_key")
+    if st.session_state.gemini_configured:
+        try:
+            gemini_api_key = secrets_manager.get_secret('api_key', section='gemini')
+            return _get_processor(gemini_api_key)
+        except Exception as e:
+            st.warning(f"Error initializing Google Gemini: {e}")
+            return _get_processor("dummy_key")
     
-    return st.session_state.gemini_processor
+    st.warning("Google Gemini API key is not configured in .streamlit/secrets.toml")
+    return _get_processor("dummy_key")
 
-def process_resumes(file_paths, user_filters, processor):
+def process_resumes(file_paths, user_filters, processor, decompose=False):
     """
-    Process a batch of resumes with the given filters
+    Process resumes with the given filters, analyzing them concurrently
     
     Args:
         file_paths: List of paths to resume files
         user_filters: Dictionary of filters to apply
         processor: GeminiProcessor instance
+        decompose: If True, analyze each resume with several smaller prompts in parallel
     """
     # Create necessary directories
     os.makedirs('data/uploads', exist_ok=True)
     os.makedirs('data/processed', exist_ok=True)
     
     total_files = len(file_paths)
-    batch_size = st.session_state.batch_size
     
     # Create UI elements for progress tracking
     status_container = st.empty()
@@ -55,55 +160,295 @@ def process_resumes(file_paths, user_filters, processor):
     st.session_state.processing_files = {}
     st.session_state.resume_data = []
     
-    # Process files in batches
-    for i in range(0, total_files, batch_size):
-        batch = file_paths[i:i+batch_size]
+    # Files with identical content and filters are only parsed once
+    parsed_cache = _parsed_resume_cache()
+    filters_key = json.dumps(user_filters, sort_keys=True, default=str)
+    
+    # Task IDs are pushed here by the processing queue as each document finishes
+    completion_queue = Queue()
+    
+    pending = _add_cached_resumes(file_paths, filters_key, parsed_cache)
+    
+    # Extract text from all files up front, spread over the CPU cores
+    if pending:
+        status_container.info(f"Extracting text from {len(pending)} resumes...")
+    texts = get_texts_from_files(list(pending))
+    status_container.info(f"Processing {total_files} resumes...")
+    
+    # Queue every file up front, the processing queue limits how many run at once.
+    # Each queued task gets one status line, rewritten only when the task finishes.
+    task_ids = []
+    status_lines = []
+    line_index = {}
+    for file_path, cache_key in pending.items():
+        task_id = processor.queue_document_for_analysis(
+            file_path, user_filters, callback=completion_queue.put, text=texts[file_path], decompose=decompose
+        )
+        task_ids.append(task_id)
+        st.session_state.processing_files[task_id] = {
+            "file_path": file_path,
+            "file_name": os.path.basename(file_path),
+            "cache_key": cache_key,
+            "status": "queued"
+        }
+        line_index[task_id] = len(status_lines)
+        status_lines.append(_status_line(st.session_state.processing_files[task_id]))
+    
+    # Cached resumes count as processed straight away
+    completed = total_files - len(task_ids)
+    unfinished_ids = set(task_ids)
+    if unfinished_ids:
+        progress_bar.progress(completed / total_files, text=f"Processed {completed}/{total_files} resumes")
+        file_status.code("\n".join(status_lines))
+    
+    # Update the progress display as each task finishes
+    while unfinished_ids:
+        try:
+            finished_ids = [completion_queue.get(timeout=1.0)]
+            while not completion_queue.empty():
+                finished_ids.append(completion_queue.get_nowait())
+        except Empty:
+            continue
+        
+        for task_id in finished_ids:
+            if task_id not in unfinished_ids:
+                continue
+            
+            task = st.session_state.processing_files[task_id]
+            result = processor.get_queued_result(task_id)
+            
+            if result["status"] == "completed":
+                task["status"] = "complete"
+                if result["data"]:
+                    _add_parsed_resume(result["data"], task["cache_key"], parsed_cache)
+            elif result["status"] == "failed":
+                task["status"] = "error"
+                task["error"] = result["error"]
+            else:
+                continue
+            
+            completed += 1
+            unfinished_ids.discard(task_id)
+            status_lines[line_index[task_id]] = _status_line(task)
+        
+        progress_bar.progress(completed / total_files, text=f"Processed {completed}/{total_files} resumes")
+        file_status.code("\n".join(status_lines))
+    
+    _finish_processing(total_files, user_filters, status_container, progress_bar)
+
+def process_resumes_batch(file_paths, user_filters, processor, query=None):
+    """
+    Process resumes with a single Gemini Batch API job
+    
+    Batch jobs are half the cost of live requests but can take up to 24 hours,
+    so this only submits the job. It is recorded in st.session_state.batch_job
+    and on disk, and batch_job_fragment collects the results once it has finished.
+    
+    Args:
+        file_paths: List of paths to resume files
+        user_filters: Dictionary of filters to apply
+        processor: GeminiProcessor instance
+        query: Natural language query to filter the results with once they arrive
+    """
+    total_files = len(file_paths)
+    
+    # Create UI elements for progress tracking
+    status_container = st.empty()
+    progress_bar = st.progress(0)
+    
+    status_container.info(f"Submitting {total_files} resumes as a Gemini batch job...")
+    
+    # Reset processing state
+    st.session_state.processing_complete = False
+    st.session_state.processing_files = {}
+    st.session_state.resume_data = []
+    
+    parsed_cache = _parsed_resume_cache()
+    filters_key = json.dumps(user_filters, sort_keys=True, default=str)
+    
+    # Only files that have not been parsed before are sent in the job
+    pending = _add_cached_resumes(file_paths, filters_key, parsed_cache)
+    
+    if pending:
+        texts = get_texts_from_files(list(pending))
         
-        # Queue all files in the current batch
-        task_ids = []
-        for file_path in batch:
-            file_name = os.path.basename(file_path)
-            task_id = processor.queue_document_for_analysis(file_path, user_filters)
-            task_ids.append(task_id)
-            st.session_state.processing_files[task_id] = {
+        try:
+            job = processor.submit_documents_batch(list(pending), user_filters, texts=texts)
+        except Exception as e:
+            st.error(f"Gemini batch job failed: {e}")
+            _add_batch_results(pending, {}, parsed_cache)
+        else:
+            batch = {
+                "job": job,
+                "file_paths": list(file_paths),
+                "user_filters": user_filters,
+                "query": query
+            }
+            st.session_state.batch_job = batch
+            save_batch_job(batch, st.session_state.session_key)
+            status_container.info(f"Submitted {len(pending)} resumes as a Gemini batch job. The results "
+                                  "appear here once it has finished, reloading this page keeps the job.")
+            return
+    
+    _finish_processing(total_files, user_filters, status_container, progress_bar)
+
+@st.fragment(run_every=BATCH_POLL_INTERVAL)
+def batch_job_fragment(processor):
+    """
+    Show the state of the session's pending batch job, checked every BATCH_POLL_INTERVAL seconds
+    
+    Once the job has finished its results are added to the processed resumes,
+    filtered with the query it was submitted with, and the whole app reruns.
+    
+    Args:
+        processor: GeminiProcessor instance
+    """
+    batch = st.session_state.get('batch_job')
+    if batch is None:
+        return
+    
+    try:
+        state, results = processor.get_documents_batch_results(batch["job"], batch["user_filters"])
+    except (TimeoutError, RuntimeError) as e:
+        st.error(f"Gemini batch job failed: {e}")
+        results = {}
+    except Exception as e:
+        # Most likely a network error, the job is checked again on the next run
+        st.warning(f"Could not check the Gemini batch job: {e}")
+        return
+    else:
+        if results is None:
+            st.info(f"Gemini batch job {state.replace('JOB_STATE_', '').lower()}, "
+                    f"waiting for {len(batch['job']['keys'])} resumes...")
+            return
+    
+    # The session state may have been lost by a reload since the job was submitted,
+    # so the cached resumes are added again
+    st.session_state.processing_files = {}
+    st.session_state.resume_data = []
+    parsed_cache = _parsed_resume_cache()
+    filters_key = json.dumps(batch["user_filters"], sort_keys=True, default=str)
+    pending = _add_cached_resumes(batch["file_paths"], filters_key, parsed_cache)
+    _add_batch_results(pending, results, parsed_cache)
+    
+    del st.session_state.batch_job
+    clear_batch_job(st.session_state.session_key)
+    _finish_processing(len(batch["file_paths"]), batch["user_filters"], st.empty(), st.progress(0))
+    
+    if batch["query"] and st.session_state.matches:
+        st.session_state.filtered_matches = filter_resumes_with_nlp(batch["query"], processor, st.session_state.matches)
+        st.session_state.filtered_version += 1
+    st.rerun()
+
+def _add_batch_results(pending, results, parsed_cache):
+    """
+    Add the results of a batch job to the session's resume data
+    
+    Args:
+        pending: Maps the paths of the files sent in the job to their cache keys
+        results: Maps file paths to their extracted information
+        parsed_cache: Parsed resume cache
+    """
+    for file_path, cache_key in pending.items():
+        task = {
+            "file_path": file_path,
+            "file_name": os.path.basename(file_path),
+            "status": "complete"
+        }
+        data = results.get(file_path)
+        if data:
+            _add_parsed_resume(data, cache_key, parsed_cache)
+        else:
+            task["status"] = "error"
+            task["error"] = "No result returned by the batch job"
+        st.session_state.processing_files[file_path] = task
+
+def _status_line(task):
+    """Format the progress line shown for a queued resume"""
+    icon = "⏳" if task["status"] == "queued" else "✅" if task["status"] == "complete" else "❌"
+    return f"{icon} {task['file_name']}: {task['status'].upper()}"
+
+def _add_cached_resumes(file_paths, filters_key, parsed_cache):
+    """
+    Add resumes that were already parsed with the same filters to the session's resume data
+    
+    Args:
+        file_paths: List of paths to resume files
+        filters_key: Serialized filters the resumes are parsed with
+        parsed_cache: Parsed resume cache
+        
+    Returns:
+        dict: Maps the paths of files that still need parsing to their cache keys,
+            files that can no longer be read are recorded as errors instead
+    """
+    pending = {}
+    for file_path in file_paths:
+        file_name = os.path.basename(file_path)
+        try:
+            cache_key = (_hash_bytes(Path(file_path).read_bytes()), filters_key)
+        except OSError as e:
+            # Uploads can be cleaned up while a batch job is still running
+            st.session_state.processing_files[file_path] = {
                 "file_path": file_path,
                 "file_name": file_name,
-                "status": "queued"
+                "status": "error",
+                "error": f"Could not read file: {e}"
             }
+            continue
         
-        # Wait for the batch to complete
-        batch_complete = False
-        while not batch_complete:
-            for task_id in task_ids:
-                result = processor.get_queued_result(task_id)
-                
-                if result["status"] == "completed":
-                    if st.session_state.processing_files[task_id]["status"] != "complete":
-                        st.session_state.processing_files[task_id]["status"] = "complete"
-                        if result["data"]:
-                            st.session_state.resume_data.append(result["data"])
-                elif result["status"] == "failed":
-                    st.session_state.processing_files[task_id]["status"] = "error"
-                    st.session_state.processing_files[task_id]["error"] = result["error"]
-            
-            completed = sum(1 for task in st.session_state.processing_files.values() 
-                          if task["status"] in ["complete", "error"])
-            progress = completed / total_files
-            progress_bar.progress(progress, text=f"Processed {completed}/{total_files} resumes")
-            
-            status_text = ""
-            for task_id in task_ids:
-                task = st.session_state.processing_files[task_id]
-                icon = "⏳" if task["status"] == "queued" else "✅" if task["status"] == "complete" else "❌"
-                status_text += f"{icon} {task['file_name']}: {task['status'].upper()}\n"
-            file_status.code(status_text)
-            
-            batch_complete = all(st.session_state.processing_files[task_id]["status"] in ["complete", "error"] 
-                              for task_id in task_ids)
-            
-            if not batch_complete:
-                time.sleep(1)
+        cached_data = parsed_cache.get(cache_key)
+        if cached_data is not None:
+            cached_data.update(filename=file_name, file_path=file_path)
+            _index_resume(cached_data)
+            st.session_state.resume_data.append(cached_data)
+            st.session_state.processing_files[f"cached:{file_path}"] = {
+                "file_path": file_path,
+                "file_name": file_name,
+                "status": "complete"
+            }
+        else:
+            pending[file_path] = cache_key
+    return pending
+
+def _add_parsed_resume(data, cache_key, parsed_cache):
+    """
+    Index a freshly parsed resume for filtering and add it to the session's resume data
+    
+    Args:
+        data: Dictionary of extracted resume data
+        cache_key: Key of the resume in the parsed resume cache
+        parsed_cache: Parsed resume cache
+    """
+    _index_resume(data)
+    st.session_state.resume_data.append(data)
+    if 'error' not in data:
+        parsed_cache.put(cache_key, data)
+
+def _index_resume(data):
+    """
+    Add the derived fields used for filtering and custom columns to a parsed resume
     
+    Args:
+        data: Dictionary of extracted resume data, updated in place
+    """
+    data['_search_blob'] = build_search_blob(data)
+    data['_tokens'] = frozenset(split_tokens(data['_search_blob']))
+    data['_signature'] = text_signature(data['_search_blob'])
+    if data.get('_extracted_text'):
+        # Sectioned text lets custom columns send only the relevant parts of the resume
+        data['_compact_text'] = compact_text(data['_extracted_text'])
+        data['_sections'] = split_text_into_sections(data['_compact_text'])
+
+def _finish_processing(total_files, user_filters, status_container, progress_bar):
+    """
+    Report the processing outcome and sort the processed resumes
+    
+    Args:
+        total_files: Number of resumes that were processed
+        user_filters: Dictionary of filters to apply
+        status_container: Placeholder used for the overall status message
+        progress_bar: Progress bar to mark as complete
+    """
     st.session_state.processing_complete = True
     
     completed = sum(1 for task in st.session_state.processing_files.values() 
@@ -131,6 +476,9 @@ def filter_and_sort_matches(user_filters):
     # With Gemini processing, filtering happens directly during document processing
     # Just sort by match score now
     st.session_state.matches = st.session_state.resume_data
+    st.session_state.matches_version += 1
     
     # Sort by match score in descending order
-    st.session_state.matches.sort(key=lambda x: x.get('match_score', 0), reverse=True)
\ No newline at end of file
+    st.session_state.matches.sort(key=lambda x: x.get('match_score', 0), reverse=True)
+    
+    save_matches(st.session_state.matches, st.session_state.session_key)
\ No newline at end of file
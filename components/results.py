@@ -1,22 +1,48 @@
+import re
+import json
 import pandas as pd
 import streamlit as st
 from utils.export import export_to_excel
-from utils.file_handler import get_text_from_file
+from utils.file_handler import get_text_from_file, compact_text, split_text_into_sections
+from utils.secrets_manager import get_secrets_manager
+from utils.session_store import save_matches
+from components.processor import initialize_processor
 
-def display_results(export_only=False):
+# Number of result rows rendered per page
+RESULTS_PAGE_SIZE = 50
+
+# Approximate number of resume text tokens sent per custom column prompt,
+# Gemini averages about 4 characters per token for English text
+CUSTOM_COLUMN_TOKEN_BUDGET = 2500
+CHARS_PER_TOKEN = 4
+
+# Word prefixes in a custom column prompt that route it to resume sections
+SECTION_KEYWORDS = {
+    'experience': ('experience', 'year', 'work', 'job', 'role', 'position', 'title',
+                   'company', 'employer', 'industry', 'manag', 'lead'),
+    'skills': ('skill', 'technolog', 'tool', 'framework', 'programming', 'language',
+               'proficien', 'stack', 'software'),
+    'education': ('education', 'degree', 'university', 'college', 'school', 'gpa',
+                  'graduat', 'major', 'study', 'studied'),
+    'projects': ('project', 'portfolio', 'built', 'github'),
+    'certifications': ('certif', 'license', 'course'),
+    'achievements': ('achievement', 'award', 'honor', 'hackathon'),
+    'summary': ('summary', 'objective', 'profile'),
+}
+
+def display_results(matches=None, export_only=False):
     """Display the results of resume parsing and analysis
     
     Args:
+        matches (list): Resumes to display, defaults to st.session_state.matches
         export_only (bool): If True, only show export options without displaying the data
     """
-    if 'matches' not in st.session_state or not st.session_state.matches:
+    if matches is None:
+        matches = st.session_state.get('matches')
+    if not matches:
         return
         
-    # Create dataframe from matches
-    df = pd.DataFrame(st.session_state.matches)
-    for col in st.session_state.display_columns:
-        if col not in df.columns:
-            df[col] = ""
+    df = _matches_dataframe(matches)
     
     # Custom Column Adder
     with st.expander("➕ Add Custom Column"):
@@ -31,77 +57,217 @@ def display_results(export_only=False):
             placeholder="e.g., Extract years of Python programming experience from this resume"
         )
         
+        verbatim = st.checkbox(
+            "Copy text verbatim from the resume",
+            help="For long fields such as job descriptions. Gemini only picks the resume lines to copy, "
+                 "which is faster and avoids paraphrasing."
+        )
+        
         # Add column button
         add_column_button = st.button("Add Column")
         
     # Process when button is clicked
     if add_column_button and column_name and column_prompt:
         with st.spinner(f"Extracting {column_name}..."):
-            extract_custom_column(column_name, column_prompt)
+            extract_custom_column(column_name, column_prompt, matches, verbatim=verbatim)
     elif add_column_button and not (column_name and column_prompt):
         st.warning("Please enter both a column name and a prompt.")
     
+    # Only render the rows of the selected page
+    page_df = df.iloc[_results_page_slice(len(df))]
+    
     # Display results table with renamed columns
     with st.container():
         if 'display_columns' in st.session_state:
-            # Create a copy of the dataframe with only the columns to display
-            display_df = df[st.session_state.display_columns].copy()
-            
-            # Rename columns that exist in the mapping
-            if 'column_mapping' in st.session_state:
-                for old_name, new_name in st.session_state.column_mapping.items():
-                    if old_name in display_df.columns:
-                        display_df.rename(columns={old_name: new_name}, inplace=True)
-            
+            display_df = _select_columns(page_df, st.session_state.display_columns)
             st.dataframe(display_df, use_container_width=True, height=600)
         else:
-            st.dataframe(df, use_container_width=True, height=600)
+            st.dataframe(page_df, use_container_width=True, height=600)
     
     # Return Excel data if export only
     if export_only:
         try:
             columns_to_export = st.session_state.display_columns if 'display_columns' in st.session_state else df.columns
             
-            # Create a copy of the dataframe with the columns to export
-            export_df = df[columns_to_export].copy()
-            
-            # Rename columns that exist in the mapping
-            if 'column_mapping' in st.session_state:
-                for old_name, new_name in st.session_state.column_mapping.items():
-                    if old_name in export_df.columns:
-                        export_df.rename(columns={old_name: new_name}, inplace=True)
-            
+            export_df = _select_columns(df, columns_to_export)
             excel_data = export_to_excel(export_df)
             return excel_data
         except Exception as e:
             st.error(f"Error preparing Excel export: {e}")
             return None
 
-def extract_custom_column(column_name, column_prompt):
+def _matches_dataframe(matches):
+    """
+    Get the dataframe of the matches, building it only when they have changed
+    
+    Args:
+        matches (list): Resumes to display
+        
+    Returns:
+        DataFrame: Resume data
+    """
+    # The counters identify the result set, the id() of a freed list can be reused by the next one
+    key = (st.session_state.matches_version, st.session_state.filtered_version,
+           matches is st.session_state.get('matches'), len(matches))
+    cached = st.session_state.get('matches_df')
+    if cached is None or cached[0] != key:
+        # Private fields such as the 2048-bit trigram signature don't fit in a column
+        cached = (key, pd.DataFrame([{field: value for field, value in resume.items() if not field.startswith('_')}
+                                     for resume in matches]))
+        st.session_state.matches_df = cached
+    return cached[1]
+
+def _select_columns(df, columns):
+    """
+    Select columns in order and rename them using the column mapping
+    
+    Args:
+        df (DataFrame): Resume data
+        columns (list): Columns to keep, missing ones are filled with ""
+        
+    Returns:
+        DataFrame: New dataframe with the selected, renamed columns
+    """
+    return df.reindex(columns=columns, fill_value="").rename(
+        columns=st.session_state.get('column_mapping', {})
+    )
+
+def _results_page_slice(total_rows):
+    """
+    Show a page selector when the results span several pages
+    
+    Args:
+        total_rows (int): Number of result rows
+        
+    Returns:
+        slice: Row positions of the selected page
+    """
+    total_pages = max((total_rows + RESULTS_PAGE_SIZE - 1) // RESULTS_PAGE_SIZE, 1)
+    page = 1
+    if total_pages > 1:
+        # Keep the selected page valid when the result set shrinks. The widget
+        # has no value argument, it starts at min_value and is otherwise set
+        # through session state.
+        if st.session_state.get('results_page', 1) > total_pages:
+            st.session_state.results_page = total_pages
+        page = st.number_input("Page", min_value=1, max_value=total_pages, step=1, key="results_page")
+    return slice((page - 1) * RESULTS_PAGE_SIZE, page * RESULTS_PAGE_SIZE)
+
+def _custom_column_text(resume, column_prompt):
+    """
+    Select the resume text sent with a custom column prompt
+    
+    The sections the prompt refers to come first, followed by the rest of
+    the resume in case the information is elsewhere, trimmed to
+    CUSTOM_COLUMN_TOKEN_BUDGET.
+    
+    Args:
+        resume (dict): Resume data
+        column_prompt (str): Prompt to extract information with
+        
+    Returns:
+        str: Resume text for the prompt
+    """
+    sections = resume.get('_sections')
+    text = resume.get('_compact_text')
+    if sections is None:
+        # Resumes parsed before sections were stored, reuse the extracted text if possible
+        text = compact_text(resume.get('_extracted_text') or get_text_from_file(resume.get('file_path', "")))
+        sections = split_text_into_sections(text)
+    
+    words = re.findall(r'[a-z]+', column_prompt.lower())
+    routed = [section for section, keywords in SECTION_KEYWORDS.items()
+              if section in sections and any(word.startswith(keywords) for word in words)]
+    if routed:
+        ordered = routed + [section for section in sections if section not in routed]
+        text = "\n".join(f"{section.upper()}\n{sections[section]}" for section in ordered)
+    
+    return text[:CUSTOM_COLUMN_TOKEN_BUDGET * CHARS_PER_TOKEN]
+
+def _extract_verbatim(processor, column_prompt, text):
+    """
+    Extract resume lines for a custom column without Gemini regenerating them
+    
+    The resume lines are numbered in the prompt and Gemini only returns the
+    line ranges to copy, which keeps responses short and the text exact.
+    
+    Args:
+        processor: GeminiProcessor instance
+        column_prompt (str): Prompt to extract information with
+        text (str): Resume text for the prompt
+        
+    Returns:
+        str: The selected resume lines
+    """
+    lines = text.splitlines()
+    numbered_text = "\n".join(f"{i:03d}: {line}" for i, line in enumerate(lines))
+    
+    custom_prompt = f"""You are locating specific information in a resume.
+
+TASK: {column_prompt}
+
+Resume text, with a line number before each line:
+{numbered_text}
+
+Return ONLY a JSON list of [start_line, end_line] pairs referencing the lines above that contain the requested information, e.g. [[3, 7], [12, 12]].
+Do not regenerate content. If the information cannot be found, return []."""
+    
+    response = processor._call_gemini_with_retry(custom_prompt)
+    
+    match = re.search(r'\[.*\]', response, re.DOTALL)
+    if not match:
+        raise ValueError("No line ranges found in response")
+    
+    ranges = json.loads(match.group(0))
+    # A single range may come back without the outer list, e.g. [3, 7]
+    if len(ranges) == 2 and all(isinstance(value, int) for value in ranges):
+        ranges = [ranges]
+    
+    selected = []
+    for line_range in ranges:
+        try:
+            start, end = line_range
+            start, end = max(int(start), 0), int(end)
+        except (TypeError, ValueError):
+            # Skip entries that are not a pair of line numbers
+            continue
+        selected.extend(lines[start:end + 1])
+    
+    return "\n".join(selected) if selected else "Not found in resume"
+
+def extract_custom_column(column_name, column_prompt, matches=None, verbatim=False):
     """
     Extract custom information from resumes using Gemini
     
     Args:
         column_name (str): Name of the new column to display
         column_prompt (str): Prompt to extract information with
+        matches (list): Resumes to extract from, defaults to st.session_state.matches
+        verbatim (bool): If True, Gemini returns line ranges that are copied from the resume text
     """
-    processor = st.session_state.gemini_processor
+    if matches is None:
+        matches = st.session_state.matches
+    
+    processor = initialize_processor(get_secrets_manager())
     
     if not processor:
         st.error("No AI processor available")
         return
     
-    for resume in st.session_state.matches:
-        file_path = resume.get('file_path', "")
+    for resume in matches:
         try:
-            text = get_text_from_file(file_path)
+            text = _custom_column_text(resume, column_prompt)
+            
+            if verbatim:
+                resume[column_name] = _extract_verbatim(processor, column_prompt, text)
+                continue
             
             custom_prompt = f"""You are extracting specific information from a resume.
 
 TASK: {column_prompt}
 
 Resume text:
-{text[:10000]}
+{text}
 
 Provide ONLY the requested information as plain text. Be precise and thorough.
 If the information cannot be found, state "Not found in resume".
@@ -113,6 +279,10 @@ Do not include explanations, analysis, or any additional text."""
         except Exception as e:
             resume[column_name] = f"Error processing: {str(e)[:50]}"
     
+    # The new column was added to the resumes in place
+    st.session_state.matches_version += 1
+    save_matches(st.session_state.matches, st.session_state.session_key)
+    
     if column_name not in st.session_state.display_columns:
         st.session_state.display_columns.append(column_name)
     
@@ -1,4 +1,10 @@
-from . import file_handler
-from . import export
-from . import gemini_processor
-from . import secrets_manager
\ No newline at end of file
+import importlib
+
+_SUBMODULES = ('file_handler', 'export', 'gemini_http', 'gemini_processor', 'llm_cache', 'secrets_manager', 'session_store')
+
+def __getattr__(name):
+    # Import submodules on first access so that importing one utility does not
+    # pull in pandas and google.generativeai through the others
+    if name in _SUBMODULES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
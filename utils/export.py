@@ -1,5 +1,6 @@
 import pandas as pd
 import io
+import xlsxwriter
 
 def export_to_excel(df):
     """
@@ -14,10 +15,21 @@ def export_to_excel(df):
     try:
         output = io.BytesIO()
         
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Matching Candidates', index=False)
-            
-        output.seek(0)
+        # constant_memory flushes each row to a temporary file once the next row
+        # is started, so the sheet is written row by row here rather than through
+        # pd.ExcelWriter, which writes column by column
+        workbook = xlsxwriter.Workbook(output, {
+            'constant_memory': True,
+            'strings_to_formulas': False,
+            'strings_to_urls': False
+        })
+        worksheet = workbook.add_worksheet('Matching Candidates')
+        
+        worksheet.write_row(0, 0, [str(col) for col in df.columns], workbook.add_format({'bold': True}))
+        for row_index, row in enumerate(df.itertuples(index=False, name=None), start=1):
+            worksheet.write_row(row_index, 0, [_excel_value(value) for value in row])
+        
+        workbook.close()
         
         return output.getvalue()
     except Exception as e:
@@ -25,4 +37,12 @@ def export_to_excel(df):
         output = io.BytesIO()
         pd.DataFrame().to_excel(output, index=False)
         output.seek(0)
-        return output.getvalue()
\ No newline at end of file
+        return output.getvalue()
+
+def _excel_value(value):
+    """Convert a DataFrame value into one xlsxwriter can write to a cell"""
+    if isinstance(value, (list, tuple, set, dict)):
+        return str(value)
+    if pd.isna(value):
+        return None
+    return value
\ No newline at end of file
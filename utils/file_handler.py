@@ -1,14 +1,64 @@
 import os
-import uuid
+import re
+import atexit
+import hashlib
+import threading
+import multiprocessing
 from pathlib import Path
-import PyPDF2
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import docx
-import pdfplumber
 import fitz  # PyMuPDF
 
+# Minimum number of files before extraction is spread over worker processes,
+# below this the cost of starting the workers outweighs the gain
+PARALLEL_EXTRACTION_THRESHOLD = 4
+
+# Worker processes are started with forkserver (or spawn), forking the
+# multithreaded app could copy locks held by other threads into the workers
+_EXTRACTION_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Extraction pool shared by every call, created on first use
+_extraction_pool = None
+_extraction_pool_lock = threading.Lock()
+
+# PyMuPDF output shorter than this is treated as a failed extraction
+MIN_PDF_TEXT_LENGTH = 200
+
+# Resume section headings, mapped to the name of the section they start
+SECTION_HEADINGS = {
+    'summary': ('summary', 'professional summary', 'profile', 'objective', 'about me'),
+    'experience': ('experience', 'work experience', 'professional experience',
+                   'employment', 'employment history', 'work history'),
+    'education': ('education', 'academic background', 'qualifications'),
+    'skills': ('skills', 'technical skills', 'key skills', 'core competencies', 'technologies'),
+    'projects': ('projects', 'personal projects', 'key projects'),
+    'certifications': ('certifications', 'certificates', 'licenses and certifications'),
+    'achievements': ('achievements', 'awards', 'honors and awards'),
+}
+
+_SECTION_ALIASES = {alias: section for section, aliases in SECTION_HEADINGS.items() for alias in aliases}
+
+# A heading is a line holding only one of the aliases, optionally followed by a colon
+_SECTION_HEADING_RE = re.compile(
+    r'^[ \t]*(' + '|'.join(alias.replace(' ', r'[ \t]+')
+                         for alias in sorted(_SECTION_ALIASES, key=len, reverse=True))
+    + r')[ \t]*:?[ \t]*$',
+    re.IGNORECASE | re.MULTILINE
+)
+
+# A file name made of 2-3 words of letters, separated by spaces, underscores or hyphens
+_NAME_RE = re.compile(r'^[^\W\d_]+(?:[\s_-]+[^\W\d_]+){1,2}$')
+_NAME_SEPARATOR_RE = re.compile(r'[\s_-]+')
+
+_HEX_DIGITS = frozenset('0123456789abcdef')
+
 def save_uploaded_files(uploaded_files):
     """
-    Save uploaded files to the uploads directory with unique filenames
+    Save uploaded files to the uploads directory, named by a hash of their content
+    
+    Files that were uploaded before are not written again, and an upload
+    containing the same file twice only returns its path once.
     
     Args:
         uploaded_files: List of uploaded file objects from Streamlit
@@ -22,11 +72,14 @@ def save_uploaded_files(uploaded_files):
     
     for uploaded_file in uploaded_files:
         file_extension = Path(uploaded_file.name).suffix
-        unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = upload_dir / unique_filename
+        content = uploaded_file.getbuffer()
+        file_path = upload_dir / f"{hashlib.sha256(content).hexdigest()}{file_extension}"
+        
+        if str(file_path) in saved_paths:
+            continue
         
-        with open(file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
+        if not file_path.exists():
+            file_path.write_bytes(content)
         
         saved_paths.append(str(file_path))
     
@@ -59,9 +112,95 @@ def get_text_from_file(file_path):
         print(f"Error extracting text from {file_path}: {e}")
         return ""
 
+def _get_extraction_pool():
+    """Get the process pool used for text extraction, creating it on first use"""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            _extraction_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context(_EXTRACTION_START_METHOD)
+            )
+            atexit.register(_extraction_pool.shutdown)
+        return _extraction_pool
+
+def _discard_extraction_pool(pool):
+    """Forget a broken extraction pool so that the next call starts a new one"""
+    global _extraction_pool
+    with _extraction_pool_lock:
+        if _extraction_pool is pool:
+            _extraction_pool = None
+    pool.shutdown(wait=False)
+
+def get_texts_from_files(file_paths):
+    """
+    Extract raw text content from several files, in parallel across CPU cores
+    
+    Args:
+        file_paths: List of file paths
+        
+    Returns:
+        Dictionary mapping each file path to its extracted text
+    """
+    if len(file_paths) < PARALLEL_EXTRACTION_THRESHOLD:
+        return {file_path: get_text_from_file(file_path) for file_path in file_paths}
+    
+    # PDF parsing is CPU bound and PyMuPDF isn't thread safe, so use processes
+    pool = _get_extraction_pool()
+    try:
+        return dict(zip(file_paths, pool.map(get_text_from_file, file_paths)))
+    except BrokenProcessPool as e:
+        _discard_extraction_pool(pool)
+        print(f"Parallel text extraction failed, extracting serially: {e}")
+        return {file_path: get_text_from_file(file_path) for file_path in file_paths}
+    except Exception as e:
+        print(f"Parallel text extraction failed, extracting serially: {e}")
+        return {file_path: get_text_from_file(file_path) for file_path in file_paths}
+
+def compact_text(text):
+    """
+    Collapse runs of spaces and blank lines in extracted text
+    
+    Args:
+        text: Extracted text content
+        
+    Returns:
+        Text with single spaces and no empty lines
+    """
+    text = re.sub(r'[ \t\r\f\v]+', ' ', text)
+    return re.sub(r' ?\n[ \n]*', '\n', text).strip()
+
+def split_text_into_sections(text):
+    """
+    Split resume text into sections at recognised headings such as EXPERIENCE or SKILLS
+    
+    Args:
+        text: Extracted text content
+        
+    Returns:
+        Dictionary mapping section names to their text. Text before the first
+        heading is stored under 'header'.
+    """
+    sections = {}
+    section = 'header'
+    start = 0
+    
+    for heading in _SECTION_HEADING_RE.finditer(text):
+        _add_section_text(sections, section, text[start:heading.start()])
+        section = _SECTION_ALIASES[' '.join(heading.group(1).lower().split())]
+        start = heading.end()
+    _add_section_text(sections, section, text[start:])
+    
+    return sections
+
+def _add_section_text(sections, section, text):
+    text = text.strip()
+    if text:
+        sections[section] = f"{sections[section]}\n{text}" if section in sections else text
+
 def extract_text_from_pdf(file_path):
     """
-    Extract raw text from PDF using multiple methods for better reliability
+    Extract raw text from PDF with PyMuPDF, falling back to pdfplumber
     
     Args:
         file_path: Path to the PDF file
@@ -74,33 +213,26 @@ def extract_text_from_pdf(file_path):
     # Try PyMuPDF first (usually most reliable)
     try:
         with fitz.open(file_path) as pdf:
-            for page in pdf:
-                text += page.get_text("text") + "\n"
-        if text.strip():
+            text = "\n".join([page.get_text("text") for page in pdf]).strip()
+        if len(text) >= MIN_PDF_TEXT_LENGTH:
             return text
     except Exception as e:
         print(f"PyMuPDF failed: {e}")
 
-    # Fall back to pdfplumber if PyMuPDF fails
+    # Fall back to pdfplumber if PyMuPDF found little or no text. Imported
+    # here since it is slow to import and rarely needed.
     try:
+        import pdfplumber
+        
         with pdfplumber.open(file_path) as pdf:
-            for page in pdf.pages:
-                text += page.extract_text() + "\n"
-        if text.strip():
-            return text
+            # extract_text returns None for pages without text
+            fallback_text = "\n".join([page.extract_text() or "" for page in pdf.pages]).strip()
+        if len(fallback_text) > len(text):
+            return fallback_text
     except Exception as e:
         print(f"pdfplumber failed: {e}")
 
-    # Last resort: PyPDF2
-    try:
-        with open(file_path, "rb") as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-    except Exception as e:
-        print(f"PyPDF2 failed: {e}")
-
-    return text.strip()
+    return text
 
 def extract_text_from_docx(file_path):
     """
@@ -146,13 +278,15 @@ def extract_name_from_file(file_path):
     Returns:
         Candidate name if it appears to be in the filename, otherwise None
     """
-    filename = os.path.basename(file_path)
-    filename = os.path.splitext(filename)[0]
-    filename = filename.replace('_', ' ').replace('-', ' ')
+    filename = os.path.splitext(os.path.basename(file_path))[0]
+    
+    # Saved uploads are named by a content hash, which is never a name
+    if len(filename) >= 32 and all(c in _HEX_DIGITS for c in filename[:8]):
+        return None
     
     # If the filename has 2-3 words and only letters, it's likely a name
-    words = filename.split()
-    if 2 <= len(words) <= 3 and all(word.isalpha() for word in words):
-        return ' '.join(words)
+    filename = filename.strip(' _-')
+    if _NAME_RE.match(filename):
+        return ' '.join(_NAME_SEPARATOR_RE.split(filename))
     
     return None
\ No newline at end of file
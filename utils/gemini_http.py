@@ -0,0 +1,99 @@
+import asyncio
+import weakref
+
+# httpx is optional, without it Gemini is called through the google-generativeai client
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    HTTPX_AVAILABLE = False
+
+# HTTP/2 needs the h2 package (httpx[http2]), without it requests share
+# HTTP/1.1 keep-alive connections instead of multiplexing one connection
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+API_URL = "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent"
+
+# Connection pool limit and per-request timeout in seconds
+MAX_CONNECTIONS = 32
+REQUEST_TIMEOUT = 120.0
+
+# One client per event loop, an httpx.AsyncClient can't be shared between loops
+_clients = weakref.WeakKeyDictionary()
+
+def get_client():
+    """
+    Get the shared async HTTP client of the running event loop
+    
+    Returns:
+        httpx.AsyncClient: Client with a connection pool reused by all requests
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS)
+        )
+        _clients[loop] = client
+    return client
+
+def close_client(loop):
+    """
+    Close the client of an event loop that has stopped and is being replaced
+    
+    Args:
+        loop: Event loop that is no longer running
+    """
+    client = _clients.pop(loop, None)
+    if client is None or client.is_closed:
+        return
+    
+    # The connections belong to the stopped loop, so run it once more to close them
+    try:
+        loop.run_until_complete(client.aclose())
+    except Exception as e:
+        print(f"Error closing HTTP client: {e}")
+
+async def generate_content(api_key, model, prompt, temperature=0.0):
+    """
+    Call the Gemini generateContent REST endpoint with a text prompt
+    
+    Args:
+        api_key: Gemini API key
+        model: Model name, with or without the "models/" prefix
+        prompt: The prompt for Gemini
+        temperature: Sampling temperature
+    
+    Returns:
+        str: Text of the first candidate
+    
+    Raises:
+        Exception: If the request fails, including the server's retry hint for rate limits
+    """
+    if model.startswith("models/"):
+        model = model[len("models/"):]
+    
+    response = await get_client().post(
+        API_URL.format(model=model),
+        json={
+            "contents": [{"parts": [{"text": prompt}]}],
+            "generationConfig": {"temperature": temperature}
+        },
+        headers={"x-goog-api-key": api_key}
+    )
+    
+    if response.status_code != 200:
+        message = f"{response.status_code} {response.text[:1000]}"
+        retry_after = response.headers.get("Retry-After")
+        if retry_after:
+            message += f" Retry-After: {retry_after}"
+        raise Exception(message)
+    
+    parts = response.json()["candidates"][0]["content"]["parts"]
+    return "".join(part.get("text", "") for part in parts)
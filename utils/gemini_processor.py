@@ -4,14 +4,30 @@ This module handles communication with Google's Generative AI API.
 """
 
 import os
+import re
 import json
 import time
 import random
+import asyncio
 import threading
-from queue import Queue
+import tempfile
+import uuid
 import concurrent.futures
+from functools import lru_cache
 from pathlib import Path
-from utils.file_handler import get_text_from_file
+from utils.file_handler import get_text_from_file, extract_name_from_file
+from utils import llm_cache, gemini_http
+
+# orjson is optional, fall back to the standard library
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _json_dumps = orjson.dumps
+except ImportError:
+    _json_loads = json.loads
+    
+    def _json_dumps(obj):
+        return json.dumps(obj).encode('utf-8')
 
 # Check if Google Generative AI is available
 try:
@@ -21,127 +37,715 @@ except ImportError:
     GEMINI_AVAILABLE = False
     print("Google Generative AI package not available. Install it using: pip install google-generativeai")
 
+# pyahocorasick is optional, the skill prefilter falls back to a regex
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# The newer google-genai SDK is only needed for Batch API jobs
+try:
+    from google import genai as genai_batch
+    BATCH_API_AVAILABLE = True
+except ImportError:
+    BATCH_API_AVAILABLE = False
+
+# Bump whenever the prompt templates change in a way that should invalidate
+# cached Gemini responses
+PROMPT_VERSION = "1"
+
+# Maximum number of live Gemini requests in flight at once. Request starts are
+# still spaced out by the RateLimiter, so this mainly overlaps response latency.
+MAX_CONCURRENT_REQUESTS = min(32, (os.cpu_count() or 1) * 4)
+
+# Number of tasks that may be queued per concurrency slot before add_task
+# blocks, so a large upload doesn't pile up everything in memory at once
+QUEUE_BACKLOG_FACTOR = 2
+
+# Maximum number of waiting resumes combined into one Gemini request once all
+# concurrency slots are busy
+MULTI_RESUME_BATCH_SIZE = 4
+
+# Documents are trimmed to this many characters before they are sent to Gemini.
+# Longer ones keep their first TRIMMED_HEAD_CHARS characters and as much of the
+# end as fits, since skills and certifications tend to be listed last.
+MAX_DOCUMENT_CHARS = 30000
+TRIMMED_HEAD_CHARS = 20000
+TRIMMED_MARKER = "\n...[truncated]...\n"
+
+# Batch API settings
+BATCH_MODEL = "gemini-2.5-flash"
+BATCH_MAX_WAIT = 24 * 60 * 60  # Batch jobs expire after 24 hours
+BATCH_TERMINAL_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED",
+                         "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+def _trim_text(text):
+    """Trim a document to MAX_DOCUMENT_CHARS, keeping its beginning and its end"""
+    if len(text) <= MAX_DOCUMENT_CHARS:
+        return text
+    tail_chars = MAX_DOCUMENT_CHARS - TRIMMED_HEAD_CHARS - len(TRIMMED_MARKER)
+    return "".join((text[:TRIMMED_HEAD_CHARS], TRIMMED_MARKER, text[-tail_chars:]))
+
+
+@lru_cache(maxsize=256)
+def _cached_text(path, mtime, size):
+    """Extract and trim the text of a file, cached per file version"""
+    return _trim_text(get_text_from_file(path))
+
+
+def _document_text(file_path):
+    """Get the trimmed text of a file, extracting it only when it has changed"""
+    stat = os.stat(file_path)
+    return _cached_text(file_path, stat.st_mtime, stat.st_size)
+
+
+@lru_cache(maxsize=32)
+def _skill_matcher(skills):
+    """Build a matcher for a tuple of lowercased skills"""
+    if AHOCORASICK_AVAILABLE:
+        automaton = ahocorasick.Automaton()
+        for skill in skills:
+            automaton.add_word(skill, skill)
+        automaton.make_automaton()
+        return automaton
+    return re.compile('|'.join(map(re.escape, skills)))
+
+
+def _mentions_any_skill(text, skills):
+    """Check whether the text mentions at least one of the skills, True when there are none"""
+    skills = tuple(sorted({str(skill).strip().lower() for skill in skills or () if str(skill).strip()}))
+    if not skills:
+        return True
+    
+    matcher = _skill_matcher(skills)
+    if AHOCORASICK_AVAILABLE:
+        return next(matcher.iter(text.lower()), None) is not None
+    return matcher.search(text.lower()) is not None
+
+
+def _file_names(file_path):
+    """Get a document's file name and stem, the stem is the source of its name hint"""
+    path = Path(file_path)
+    return path.name, path.stem
+
+
+# Server supplied retry hints in Gemini errors, e.g. "retry_delay { seconds: 37 }",
+# "retryDelay": "37s", "Retry-After: 37" or "Please retry in 37.5s"
+_RETRY_DELAY_RE = re.compile(
+    r'retry_delay\s*\{\s*seconds:\s*(\d+)|"retryDelay":\s*"(\d+(?:\.\d+)?)s"'
+    r'|retry-after:?\s*(\d+(?:\.\d+)?)|retry in (\d+(?:\.\d+)?)s',
+    re.IGNORECASE
+)
+
+def _retry_delay(error):
+    """Get the retry delay in seconds suggested by a Gemini error, if any"""
+    if error is None:
+        return None
+    
+    retry_delay = getattr(error, 'retry_delay', None)
+    if retry_delay is not None:
+        return float(getattr(retry_delay, 'seconds', retry_delay))
+    
+    match = _RETRY_DELAY_RE.search(str(error))
+    if match:
+        return float(next(group for group in match.groups() if group))
+    return None
+
+
+# Outermost JSON object in a response, from the first "{" to the last "}"
+_JSON_OBJECT_RE = re.compile(rb'\{.*\}', re.DOTALL)
+
+# Outermost JSON array in a multi-resume response
+_JSON_ARRAY_RE = re.compile(rb'\[.*\]', re.DOTALL)
+
+
 class RateLimiter:
     """
     Implements rate limiting for API calls with adaptive backoff
+    
+    Requests are admitted by a token bucket that refills one token per
+    `current_delay` seconds and holds up to `burst` tokens, so concurrent
+    callers can go ahead together while the average rate stays capped.
+    
+    The delay follows AIMD: it is multiplied on failure (or raised to the
+    server's retry hint) and only lowered by a small step once a whole window
+    of requests has succeeded, with no lowering at all for two windows after
+    a failure.
     """
-    def __init__(self, initial_delay=1, max_delay=60, backoff_factor=1.5):
+    def __init__(self, initial_delay=1, max_delay=60, backoff_factor=1.5,
+                 window=10.0, window_successes=5, decrease_step=0.1, burst=4):
+        self.initial_delay = initial_delay
         self.current_delay = initial_delay
         self.max_delay = max_delay
         self.backoff_factor = backoff_factor
-        self.last_request_time = 0
+        self.window = window
+        self.window_successes = window_successes
+        self.decrease_step = decrease_step
+        self.successes_in_window = 0
+        self.window_start = time.time()
+        self.cooldown_until = 0
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
         self.lock = threading.Lock()
     
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) / self.current_delay)
+        self.updated = now
+    
     def wait(self):
-        """Wait the appropriate amount of time before next request"""
+        """Wait until a token is available for the next request"""
         with self.lock:
-            elapsed = time.time() - self.last_request_time
-            if elapsed < self.current_delay:
-                time.sleep(self.current_delay - elapsed)
-            self.last_request_time = time.time()
+            self._refill()
+            self.tokens -= 1
+            
+            # A negative balance reserves a future token, the lock is released
+            # before sleeping so other callers can reserve theirs
+            sleep_time = -self.tokens * self.current_delay
+        
+        if sleep_time > 0:
+            time.sleep(sleep_time + random.uniform(0, 0.05))
     
     def success(self):
         """Call after successful request to gradually decrease wait time"""
         with self.lock:
-            # Gradually decrease delay after successful calls, but not below initial
-            self.current_delay = max(self.current_delay / 1.2, 1)
+            now = time.time()
+            if now < self.cooldown_until:
+                return
+            
+            self.successes_in_window += 1
+            if self.successes_in_window >= self.window_successes and now - self.window_start > self.window:
+                self.current_delay = max(self.current_delay - self.decrease_step, self.initial_delay)
+                self.successes_in_window = 0
+                self.window_start = now
     
-    def failure(self):
+    def failure(self, error=None):
         """Call after rate limit failure to increase wait time"""
         with self.lock:
-            # Increase delay with some randomness to avoid synchronized retries
-            jitter = random.uniform(0.8, 1.2)
-            self.current_delay = min(self.current_delay * self.backoff_factor * jitter, self.max_delay)
+            retry_after = _retry_delay(error)
+            if retry_after is not None:
+                self.current_delay = min(max(self.current_delay, retry_after), self.max_delay)
+            else:
+                # Increase delay with some randomness to avoid synchronized retries
+                jitter = random.uniform(0.8, 1.2)
+                self.current_delay = min(self.current_delay * self.backoff_factor * jitter, self.max_delay)
+            
+            # Drop the remaining burst so the next requests are spaced out
+            self._refill()
+            self.tokens = min(self.tokens, 0)
+            
+            now = time.time()
+            self.cooldown_until = now + 2 * self.window
+            self.successes_in_window = 0
+            self.window_start = now
             return self.current_delay
 
 class ProcessingQueue:
     """
-    Manages a queue of resume processing tasks with rate limiting
+    Manages resume processing tasks, running up to `concurrency` of them at
+    once on a background asyncio event loop with rate limiting
+    
+    At most `concurrency * QUEUE_BACKLOG_FACTOR` tasks are queued or running
+    at a time, adding more blocks until one of them finishes. Each task is
+    tracked by its own future, so reading the status of one task never
+    waits on the others. Finished tasks are forgotten once their result has
+    been read.
     """
-    def __init__(self, processor):
+    def __init__(self, processor, concurrency=MAX_CONCURRENT_REQUESTS):
         self.processor = processor
-        self.queue = Queue()
-        self.results = {}
-        self.processing = False
+        self.concurrency = concurrency
+        self.tasks = {}
+        self.started = set()
+        self.waiting = []
+        self.loop = None
+        self.semaphore = None
         self.worker_thread = None
+        self.slots = threading.BoundedSemaphore(concurrency * QUEUE_BACKLOG_FACTOR)
         self.lock = threading.Lock()
     
-    def add_task(self, file_path, user_filters=None, callback=None):
-        """Add a resume processing task to the queue"""
-        task_id = str(Path(file_path).stem)
-        self.queue.put((task_id, file_path, user_filters))
-        self.results[task_id] = {"status": "queued", "data": None, "error": None}
+    def add_task(self, file_path, user_filters=None, callback=None, text=None, decompose=False):
+        """
+        Add a resume processing task to the queue
+        
+        The optional callback is called with the task ID once the task has
+        completed or failed. Text that was already extracted from the file
+        can be passed to skip extracting it again, and decompose analyzes the
+        resume with several smaller prompts in parallel.
         
-        # Start processing if not already running
-        if not self.processing:
-            self.start_processing()
+        Returns a task ID that is unique to this call, so sessions analyzing
+        the same file don't share a task.
+        """
+        file_names = _file_names(file_path)
+        task_id = uuid.uuid4().hex
+        
+        # Start processing if not already running. This comes before taking a
+        # slot, restarting a dead loop fails its stranded tasks, which frees
+        # the slots they still hold.
+        self.start_processing()
+        self.slots.acquire()
+        
+        with self.lock:
+            future = asyncio.run_coroutine_threadsafe(
+                self._process_task(task_id, file_path, file_names, user_filters, text, decompose), self.loop
+            )
+            self.tasks[task_id] = future
+        
+        future.add_done_callback(lambda _: self.slots.release())
+        if callback:
+            future.add_done_callback(lambda _: callback(task_id))
         
         return task_id
     
     def start_processing(self):
-        """Start the background processing thread"""
-        if not self.processing:
-            self.processing = True
-            self.worker_thread = threading.Thread(target=self._process_queue)
-            self.worker_thread.daemon = True
-            self.worker_thread.start()
-    
-    def _process_queue(self):
-        """Process queue items one by one with rate limiting"""
-        while not self.queue.empty():
-            # Get the next task
-            task_id, file_path, user_filters = self.queue.get()
-            
-            # Update status to processing
-            with self.lock:
-                self.results[task_id]["status"] = "processing"
-            
-            try:
-                # Process the resume
-                if user_filters:
-                    result = self.processor.analyze_document_with_filters(file_path, user_filters)
-                else:
-                    result = self.processor.analyze_document(file_path)
+        """Start the background event loop thread, or restart it if it has died"""
+        with self.lock:
+            if self.worker_thread is None or not self.worker_thread.is_alive():
+                # Tasks left on a loop that stopped would otherwise never finish
+                for future in self.tasks.values():
+                    if not future.done():
+                        future.set_exception(RuntimeError("Processing stopped before the task finished"))
                 
-                # Store the result
-                with self.lock:
-                    self.results[task_id] = {
-                        "status": "completed",
-                        "data": result,
-                        "error": None
-                    }
-            
-            except Exception as e:
-                with self.lock:
-                    self.results[task_id] = {
-                        "status": "failed",
-                        "data": None,
-                        "error": str(e)
-                    }
-            
-            self.queue.task_done()
+                if self.loop is not None and not self.loop.is_running():
+                    # Errors of the tasks failed above are of no use once their loop is replaced
+                    self.loop.set_exception_handler(lambda loop, context: None)
+                    gemini_http.close_client(self.loop)
+                    self.loop.close()
+                
+                self.waiting = []
+                self.loop = asyncio.new_event_loop()
+                # Text extraction and rate limiter waits run in the default
+                # executor, which is smaller than `concurrency` on machines with
+                # few cores and would cap the requests in flight
+                self.loop.set_default_executor(
+                    concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency)
+                )
+                self.semaphore = asyncio.Semaphore(self.concurrency)
+                self.worker_thread = threading.Thread(target=self.loop.run_forever)
+                self.worker_thread.daemon = True
+                self.worker_thread.start()
+    
+    async def _process_task(self, task_id, file_path, file_names, user_filters, text, decompose):
+        """
+        Process a single queue item once a concurrency slot is free
+        
+        If other items are still waiting for a slot by then, up to
+        MULTI_RESUME_BATCH_SIZE compatible ones are analyzed together with it
+        in a single request, and their own tasks only wait for that result.
+        """
+        entry = {
+            "task_id": task_id,
+            "file_path": file_path,
+            "file_names": file_names,
+            "user_filters": user_filters,
+            "text": text,
+            "decompose": decompose,
+            "taken": False,
+            "result": self.loop.create_future()
+        }
+        self.waiting.append(entry)
+        
+        slot = asyncio.ensure_future(self.semaphore.acquire())
+        await asyncio.wait((slot, entry["result"]), return_when=asyncio.FIRST_COMPLETED)
+        
+        if entry["taken"]:
+            # Another task took this one into its batch, give back or stop waiting for the slot
+            if not slot.cancel():
+                self.semaphore.release()
+            return await entry["result"]
+        
+        try:
+            await self._run_batch(self._take_batch(entry))
+        finally:
+            self.semaphore.release()
+        return entry["result"].result()
+    
+    def _take_batch(self, entry):
+        """Remove an entry from the waiting list, together with compatible entries still waiting"""
+        batch = [entry]
+        self.waiting.remove(entry)
+        
+        # Only combine requests while every slot is busy, otherwise they run in parallel anyway
+        if not entry["decompose"] and self.semaphore.locked():
+            for other in list(self.waiting):
+                if len(batch) >= MULTI_RESUME_BATCH_SIZE:
+                    break
+                if not other["decompose"] and other["user_filters"] == entry["user_filters"]:
+                    self.waiting.remove(other)
+                    batch.append(other)
         
-        self.processing = False
+        for item in batch:
+            item["taken"] = True
+            self.started.add(item["task_id"])
+        return batch
+    
+    async def _run_batch(self, batch):
+        """Analyze the entries of a batch and resolve their results"""
+        try:
+            if len(batch) == 1:
+                entry = batch[0]
+                results = [await self.processor.analyze_document_async(
+                    entry["file_path"], entry["user_filters"], entry["text"], entry["decompose"], entry["file_names"]
+                )]
+            else:
+                results = await self.processor.analyze_documents_async(
+                    [entry["file_path"] for entry in batch], batch[0]["user_filters"],
+                    [entry["text"] for entry in batch], [entry["file_names"] for entry in batch]
+                )
+        except Exception as e:
+            for entry in batch:
+                entry["result"].set_exception(e)
+            return
+        
+        for entry, result in zip(batch, results):
+            entry["result"].set_result(result)
+    
+    def _task_state(self, task_id, future):
+        """Build the status entry for a task from its future"""
+        if not future.done():
+            status = "processing" if task_id in self.started else "queued"
+            return {"status": status, "data": None, "error": None}
+        
+        error = future.exception()
+        if error is not None:
+            return {"status": "failed", "data": None, "error": str(error)}
+        return {"status": "completed", "data": future.result(), "error": None}
     
     def get_result(self, task_id):
-        """Get the result of a specific task"""
-        with self.lock:
-            return self.results.get(task_id, {"status": "unknown", "data": None, "error": None})
+        """Get the result of a specific task, forgetting the task once it has finished"""
+        future = self.tasks.get(task_id)
+        if future is None:
+            return {"status": "unknown", "data": None, "error": None}
+        if future.done():
+            self._forget(task_id)
+        return self._task_state(task_id, future)
     
     def get_all_results(self):
-        """Get all completed results"""
+        """Get all completed results, forgetting the tasks they belong to"""
+        results = {}
+        for task_id, future in list(self.tasks.items()):
+            if future.done() and future.exception() is None and future.result() is not None:
+                results[task_id] = future.result()
+                self._forget(task_id)
+        return results
+    
+    def _forget(self, task_id):
+        """Drop a finished task, its result is no longer kept by the queue"""
         with self.lock:
-            return {task_id: data["data"] for task_id, data in self.results.items() 
-                    if data["status"] == "completed" and data["data"] is not None}
+            self.tasks.pop(task_id, None)
+            self.started.discard(task_id)
     
     def is_queue_empty(self):
         """Check if the queue is empty"""
-        return self.queue.empty() and not self.processing
+        return all(future.done() for future in list(self.tasks.values()))
     
     def get_all_task_statuses(self):
         """Get the status of all tasks"""
-        with self.lock:
-            return {task_id: data["status"] for task_id, data in self.results.items()}
+        return {task_id: self._task_state(task_id, future)["status"]
+                for task_id, future in list(self.tasks.items())}
+
+
+# Static parts of the Gemini prompts. Each prompt is assembled with a single
+# join around the resume text, the name hint and the filter context.
+_NAME_HINT_TEMPLATE = "\nHINT: The candidate's name might be '{}' based on the filename."
+
+_RESUME_TEXT_FOOTER = """
+Your output must be ONLY the JSON object without any additional text. Ensure the JSON is valid.
+
+RESUME TEXT:
+"""
+
+_PARSING_PROMPT_INTRO = "You are an expert resume parser with extensive experience in HR and technical recruiting. Extract precise information from this resume:"
+
+_PARSING_PROMPT_BODY = """
+
+# EXTRACTION GUIDELINES:
+
+## Personal Information
+1. Name: Extract the full name
+2. Email: Extract complete email address
+3. Phone: Extract phone number with formatting
+4. Location: Extract city, state/province, country information
+
+## Professional Details
+5. Work Experience:
+   - Calculate total years of experience (round to nearest whole number)
+   - Count internships as valid experience
+   - Identify all companies and positions held
+   - Extract dates of employment
+   - Note key responsibilities and achievements
+
+6. Education:
+   - Extract all degrees, major fields of study
+   - Extract educational institutions
+   - Extract graduation years
+   - Note any academic honors or GPA if mentioned
+
+7. Technical Information:
+   - Skills: Extract ALL technical skills mentioned anywhere in the resume
+   - Languages: Extract all programming and human languages with proficiency levels
+   - Certifications: Extract all professional certifications
+
+# FORMAT REQUIREMENTS:
+
+Create a clean, structured JSON object with these exact fields:
+{
+  "name": string (full name),
+  "email": string (complete email),
+  "phone": string (full phone number),
+  "location": string (complete location details),
+  "experience": number (total years as integer),
+  "work_history": Array of objects with company, position, dates, and responsibilities,
+  "education": Array of objects with degree, institution, year, and field of study,
+  "skills": Array of strings (all technical skills),
+  "linkedin": string (complete URL or empty string if not present),
+  "github": string (complete URL or empty string if not present),
+  "languages": Array of objects with language name and proficiency level,
+  "certifications": Array of strings (all certifications)  
+}
+"""
+
+_PARSING_PROMPT_OUTPUT = """
+Your output must be ONLY the JSON object without any additional text. Ensure the JSON is valid and properly formatted.
+
+RESUME TEXT:
+"""
+
+_FILTER_PROMPT_INTRO = "You are an expert resume parser and talent evaluator. Extract precise information from this resume and evaluate how well the candidate matches the job requirements."
+
+_FILTER_PROMPT_REQUIREMENTS = "\n\n# JOB REQUIREMENTS - IMPORTANT\n"
+
+_FILTER_PROMPT_BODY = """
+Pay special attention to these requirements throughout your analysis.
+
+# RESUME EXTRACTION GUIDELINES:
+1. Extract all personal information accurately (name, email, phone, location)
+2. Calculate total years of experience (include internships)
+3. Extract all education details (degrees, institutions, years, fields of study)
+4. Extract ALL technical skills mentioned throughout the resume, including in project descriptions
+5. Extract work history with dates, companies, positions, and key responsibilities
+6. Extract languages, certifications, and online profiles
+
+# CANDIDATE EVALUATION GUIDELINES:
+1. Give a precise match score from 0-100 based on how well the candidate matches the job requirements
+2. Provide 3-5 specific reasons why the candidate is a good match, with concrete examples from their resume
+3. Identify any gaps between the candidate's qualifications and the job requirements
+4. Be objective and evidence-based in your evaluation
+
+# FORMAT REQUIREMENTS:
+Create a clean JSON object with these exact fields:
+{
+  "name": string (full name),
+  "email": string (complete email),
+  "phone": string (full phone number),
+  "location": string (complete location details),
+  "experience": number (total years as integer),
+  "work_history": Array of objects with company, position, dates, and responsibilities,
+  "education": Array of objects with degree, institution, year, and field of study,
+  "skills": Array of strings (all technical skills),
+  "linkedin": string (complete URL),
+  "github": string (complete URL),
+  "languages": Array of objects with language name and proficiency level,
+  "certifications": Array of strings (all certifications),
+  "match_score": number between 0-100 representing how well this candidate matches the requirements,
+  "match_reasons": Array of strings explaining why this candidate is a good match (with specific examples),
+  "gap_analysis": Array of strings identifying skills or qualifications the candidate is missing
+}
+"""
+
+_MULTI_RESUME_PROMPT_OUTPUT = """
+# MULTIPLE RESUMES
+This request contains {count} resumes, each starting with a "## RESUME <number>" heading. Apply the instructions above to each resume separately.
+
+Add an "index" field to each JSON object holding the number of the resume it describes, e.g. "index": 2 for "## RESUME 2".
+
+Your output must be ONLY a JSON array holding one such JSON object per resume, in the same order as the resumes, without any additional text. Ensure the JSON is valid.
+"""
+
+_BASIC_INFO_PROMPT_INTRO = "You are an expert resume parser. Extract the candidate's personal and profile information from this resume:"
+
+_BASIC_INFO_PROMPT_BODY = """
+
+Create a clean JSON object with these exact fields:
+{
+  "name": string (full name),
+  "email": string (complete email),
+  "phone": string (full phone number),
+  "location": string (city, state/province, country),
+  "linkedin": string (complete URL or empty string if not present),
+  "github": string (complete URL or empty string if not present),
+  "languages": Array of objects with language name and proficiency level,
+  "certifications": Array of strings (all certifications)
+}
+"""
+
+_EXPERIENCE_PROMPT = """You are an expert resume parser. Extract the candidate's work experience and education from this resume.
+
+- Calculate total years of experience (round to nearest whole number), counting internships as valid experience
+- Include every company and position with employment dates and key responsibilities
+- Include every degree with institution, graduation year and field of study
+
+Create a clean JSON object with these exact fields:
+{
+  "experience": number (total years as integer),
+  "work_history": Array of objects with company, position, dates, and responsibilities,
+  "education": Array of objects with degree, institution, year, and field of study
+}
+"""
+
+_SKILLS_PROMPT = """You are an expert resume parser. Extract ALL technical skills mentioned anywhere in this resume, including in project descriptions.
+
+Create a clean JSON object with these exact fields:
+{
+  "skills": Array of strings (all technical skills)
+}
+"""
+
+_MATCH_PROMPT_INTRO = """You are an expert talent evaluator. Extract the candidate's skills from this resume and evaluate how well the candidate matches the job requirements.
+
+# JOB REQUIREMENTS - IMPORTANT
+"""
+
+_MATCH_PROMPT_BODY = """
+# CANDIDATE EVALUATION GUIDELINES:
+1. Extract ALL technical skills mentioned throughout the resume, including in project descriptions
+2. Give a precise match score from 0-100 based on how well the candidate matches the job requirements
+3. Provide 3-5 specific reasons why the candidate is a good match, with concrete examples from their resume
+4. Identify any gaps between the candidate's qualifications and the job requirements
+5. Be objective and evidence-based in your evaluation
+
+Create a clean JSON object with these exact fields:
+{
+  "skills": Array of strings (all technical skills),
+  "match_score": number between 0-100 representing how well this candidate matches the requirements,
+  "match_reasons": Array of strings explaining why this candidate is a good match (with specific examples),
+  "gap_analysis": Array of strings identifying skills or qualifications the candidate is missing
+}
+"""
+
+
+def _format_comma_list(values):
+    """Format a list of strings, e.g. skills, as a comma separated string"""
+    return ", ".join(values)
+
+
+def _format_education_entry(edu):
+    """Format one education entry as "degree from institution (year), field" """
+    parts = [" from ".join(str(edu[key]) for key in ('degree', 'institution') if edu.get(key))]
+    if 'year' in edu:
+        parts.append(f" ({edu['year']})")
+    if 'field' in edu:
+        parts.append(f", {edu['field']}")
+    return "".join(parts)
+
+
+def _format_education(entries):
+    """Format education entries as a semicolon separated string"""
+    return "; ".join([_format_education_entry(edu) for edu in entries if isinstance(edu, dict)])
+
+
+def _format_language_entry(lang):
+    """Format one language entry as "language (proficiency)" """
+    if isinstance(lang, str):
+        return lang
+    if 'proficiency' in lang:
+        return f"{lang['name']} ({lang['proficiency']})"
+    return str(lang['name'])
+
+
+def _format_languages(entries):
+    """Format language entries as a comma separated string"""
+    return ", ".join([_format_language_entry(lang) for lang in entries
+                      if isinstance(lang, str) or (isinstance(lang, dict) and 'name' in lang)])
+
+
+def _format_job_entry(job):
+    """Format one work history entry as "position at company (dates)" """
+    parts = [" at ".join(str(job[key]) for key in ('position', 'company') if job.get(key))]
+    if 'dates' in job:
+        parts.append(f" ({job['dates']})")
+    return "".join(parts)
+
+
+def _format_work_history(jobs):
+    """Summarize work history entries as a semicolon separated string"""
+    return "; ".join([_format_job_entry(job) for job in jobs if isinstance(job, dict)])
+
+
+def _format_match_reasons(reasons):
+    """Format match reasons as a bulleted list"""
+    if not reasons:
+        return ""
+    return "- " + "\n- ".join(reasons)
+
+
+def _format_gap_analysis(gaps):
+    """Format the gap analysis as a bulleted list"""
+    if not gaps:
+        return "No significant gaps identified."
+    return "Areas for improvement:\n- " + "\n- ".join(gaps)
+
+
+# Fields every parsed Gemini response has, with the values used when Gemini
+# left them out. List fields that are formatted into strings start out empty.
+_RESULT_TEMPLATE = {
+    'name': "",
+    'email': "",
+    'phone': "",
+    'location': "",
+    'experience': "",
+    'skills': "",
+    'education': "",
+    'linkedin': "",
+    'github': "",
+    'languages': "",
+    'certifications': "",
+    'match_score': 0,
+}
+
+# List fields of a parsed Gemini response: (field, field the formatted text is
+# stored under, formatter). Without a text field a list value is replaced by
+# its formatted string.
+_LIST_FIELD_FORMATS = (
+    ('skills', None, _format_comma_list),
+    ('work_history', 'work_history_summary', _format_work_history),
+    ('education', None, _format_education),
+    ('languages', None, _format_languages),
+    ('certifications', None, _format_comma_list),
+    ('match_reasons', 'match_reasons_text', _format_match_reasons),
+    ('gap_analysis', 'gap_analysis_text', _format_gap_analysis),
+)
+
+# Result for a response that could not be parsed; its list fields are added
+# fresh for every result
+_UNPARSED_RESULT_TEMPLATE = {
+    'name': 'Unknown',
+    'email': '',
+    'phone': '',
+    'education': '',
+    'experience': 0,
+    'skills': '',
+    'location': '',
+    'linkedin': '',
+    'github': '',
+    'languages': '',
+    'certifications': '',
+    'work_history_summary': '',
+    'match_score': 0,
+    'match_reasons_text': '',
+    'gap_analysis_text': 'No analysis available.'
+}
+
+# Fields of the result for a document that failed, besides its name, file and error
+_ERROR_RESULT_TEMPLATE = {
+    'email': '',
+    'phone': '',
+    'education': '',
+    'experience': 0,
+    'skills': '',
+    'location': '',
+}
 
 
 class GeminiProcessor:
@@ -155,234 +759,583 @@ class GeminiProcessor:
         self.rate_limiter = RateLimiter()
         self.lock = threading.Lock()
         self.queue = ProcessingQueue(self)
+        self.generative_model = None
         
         if not GEMINI_AVAILABLE:
             print("Warning: Google Generative AI package not available. Install with pip install google-generativeai")
             return
         
-        # Configure the Gemini API
+        # Configure the Gemini API and create the model once, it is shared by
+        # every request including the ones made from worker threads
         try:
             genai.configure(api_key=api_key)
+            self.generative_model = genai.GenerativeModel(self.model)
         except Exception as e:
             print(f"Error configuring Gemini: {e}")
     
-    def analyze_document(self, file_path):
+    def analyze_document(self, file_path, text=None, decompose=False):
+        """
+        Analyze a document using Gemini with structured output
+        
+        Parameters:
+        - file_path: Path to the document file
+        - text: Optional text already extracted from the file
+        - decompose: If True, extract the information with several smaller prompts in parallel
+        
+        Returns:
+        - Extracted information as a dictionary
+        """
+        return self._run_async(self.analyze_document_async(file_path, None, text, decompose))
+    
+    def analyze_document_with_filters(self, file_path, user_filters, text=None, decompose=False):
+        """
+        Analyze a document using Gemini, incorporating user filter preferences
+        
+        Parameters:
+        - file_path: Path to the document file
+        - user_filters: Dictionary containing user's filter preferences
+        - text: Optional text already extracted from the file
+        - decompose: If True, extract the information with several smaller prompts in parallel
+        
+        Returns:
+        - Extracted information as a dictionary with match score
+        """
+        return self._run_async(self.analyze_document_async(file_path, user_filters, text, decompose))
+    
+    async def analyze_document_async(self, file_path, user_filters=None, text=None, decompose=False, file_names=None):
+        """
+        Analyze a document using Gemini without blocking the event loop
+        
+        Parameters:
+        - file_path: Path to the document file
+        - user_filters: Optional dictionary containing user's filter preferences
+        - text: Optional text already extracted from the file
+        - decompose: If True, extract the information with several smaller prompts in parallel
+        - file_names: Optional (file name, stem) pair already split from file_path
+        
+        Returns:
+        - Extracted information as a dictionary, with a match score when filters are given
+        """
+        if not GEMINI_AVAILABLE:
+            return self._error_result(file_path, "Google Generative AI package not installed", user_filters)
+        
+        try:
+            text = await asyncio.to_thread(self._prepare_text, file_path, text)
+            
+            # Get the filename without extension (may contain candidate name)
+            filename, stem = file_names or _file_names(file_path)
+            name_from_filename = stem.replace('_', ' ').replace('-', ' ')
+            
+            # Resumes that mention none of the required skills are not worth a request
+            if user_filters and not _mentions_any_skill(text, user_filters.get('skills')):
+                return self._unmatched_result(file_path, filename, text, user_filters)
+            
+            if decompose:
+                prompts = self._create_sub_prompts(text, user_filters, name_from_filename)
+            elif user_filters:
+                prompts = [self._create_resume_parsing_prompt_with_filters(text, user_filters, name_from_filename)]
+            else:
+                prompts = [self._create_resume_parsing_prompt(text, name_from_filename)]
+            
+            # Send all prompts at once and merge the parsed responses
+            responses = await asyncio.gather(*(self._acall_gemini_with_retry(prompt) for prompt in prompts))
+            extracted_info = self._parse_responses(responses)
+            
+            # Add file info
+            extracted_info['filename'] = filename
+            extracted_info['file_path'] = file_path
+            
+            # Keep the text so later custom column extraction does not re-parse the file
+            extracted_info['_extracted_text'] = text
+            
+            return extracted_info
+        except Exception as e:
+            print(f"Error analyzing document {file_path}: {e}")
+            return self._error_result(file_path, e, user_filters)
+    
+    async def analyze_documents_async(self, file_paths, user_filters=None, texts=None, file_names=None):
+        """
+        Analyze several documents using a single Gemini request
+        
+        Documents whose text can't be extracted, or that are missing from the
+        combined response, are analyzed again on their own.
+        
+        Parameters:
+        - file_paths: Paths to the document files
+        - user_filters: Optional dictionary containing user's filter preferences
+        - texts: Optional list of texts already extracted from the files, None for files still to be read
+        - file_names: Optional list of (file name, stem) pairs already split from the file paths
+        
+        Returns:
+        - List of extracted information dictionaries, in the same order as the file paths
+        """
+        texts = texts or [None] * len(file_paths)
+        file_names = [names or _file_names(file_path)
+                      for file_path, names in zip(file_paths, file_names or [None] * len(file_paths))]
+        results = [None] * len(file_paths)
+        
+        if GEMINI_AVAILABLE:
+            # Leave documents without usable text to the single analysis, which reports the error
+            prepared = {}
+            for index, file_path in enumerate(file_paths):
+                try:
+                    prepared[index] = await asyncio.to_thread(self._prepare_text, file_path, texts[index])
+                except Exception:
+                    continue
+                
+                if user_filters and not _mentions_any_skill(prepared[index], user_filters.get('skills')):
+                    results[index] = self._unmatched_result(file_path, file_names[index][0],
+                                                            prepared.pop(index), user_filters)
+            
+            if len(prepared) > 1:
+                indexes = list(prepared)
+                name_hints = [file_names[index][1].replace('_', ' ').replace('-', ' ') for index in indexes]
+                prompt = self._create_multi_resume_prompt([prepared[index] for index in indexes], user_filters, name_hints)
+                
+                try:
+                    response = await self._acall_gemini_with_retry(prompt)
+                    parsed = self._parse_batch_response(response, len(indexes))
+                except Exception as e:
+                    print(f"Error analyzing {len(indexes)} documents together, analyzing them one by one: {e}")
+                    parsed = [None] * len(indexes)
+                
+                for index, extracted_info in zip(indexes, parsed):
+                    if extracted_info is not None:
+                        extracted_info['filename'] = file_names[index][0]
+                        extracted_info['file_path'] = file_paths[index]
+                        extracted_info['_extracted_text'] = prepared[index]
+                        results[index] = extracted_info
+        
+        missing = [index for index, result in enumerate(results) if result is None]
+        singles = await asyncio.gather(*(
+            self.analyze_document_async(file_paths[index], user_filters, texts[index], False, file_names[index])
+            for index in missing
+        ))
+        for index, result in zip(missing, singles):
+            results[index] = result
+        
+        return results
+    
+    def _run_async(self, coroutine):
+        """Run a coroutine on the processing queue's event loop and wait for its result"""
+        self.queue.start_processing()
+        return asyncio.run_coroutine_threadsafe(coroutine, self.queue.loop).result()
+    
+    def _call_gemini_with_retry(self, prompt, max_retries=3):
+        """
+        Call Gemini API with retries and backoff
+        
+        Responses are cached on disk by model, prompt version and prompt, so
+        repeating an identical prompt does not call the API again.
+        
+        Parameters:
+        - prompt: The prompt for Gemini
+        - max_retries: Maximum number of retry attempts
+        
+        Returns:
+        - Response from Gemini
+        """
+        if not GEMINI_AVAILABLE:
+            return "Google Generative AI not available"
+        
+        cache_key = llm_cache.make_key(self.model, PROMPT_VERSION, prompt)
+        cached_response = llm_cache.get(cache_key)
+        if cached_response is not None:
+            return cached_response
+            
+        attempts = 0
+        last_exception = None
+        
+        while attempts < max_retries:
+            try:
+                # Wait according to rate limiter
+                self.rate_limiter.wait()
+                
+                # Call Gemini
+                response = self._call_gemini(prompt)
+                
+                # Update rate limiter on success
+                self.rate_limiter.success()
+                
+                llm_cache.set(cache_key, response)
+                return response
+            except Exception as e:
+                last_exception = e
+                attempts += 1
+                
+                # Update rate limiter and wait before retry
+                wait_time = self.rate_limiter.failure(e)
+                print(f"API error: {str(e)}. Retrying after {wait_time:.2f} seconds. Attempt {attempts}/{max_retries}")
+                time.sleep(wait_time)
+        
+        # If all retries fail, raise the exception
+        raise Exception(f"Maximum retries ({max_retries}) exceeded: {str(last_exception)}")
+    
+    def _call_gemini(self, prompt):
+        """
+        Call the Gemini API with the given prompt
+        
+        Parameters:
+        - prompt: The prompt for Gemini
+        
+        Returns:
+        - Response text from Gemini
+        """
+        if not GEMINI_AVAILABLE:
+            return "Google Generative AI not available"
+            
+        try:
+            response = self.generative_model.generate_content(
+                prompt,
+                generation_config={"temperature": 0.0}
+            )
+            return response.text
+        except Exception as e:
+            raise Exception(f"Gemini API call failed: {str(e)}")
+    
+    async def _acall_gemini_with_retry(self, prompt, max_retries=3):
+        """
+        Call Gemini API asynchronously with retries and backoff
+        
+        Uses the same response cache and rate limiter as _call_gemini_with_retry.
+        
+        Parameters:
+        - prompt: The prompt for Gemini
+        - max_retries: Maximum number of retry attempts
+        
+        Returns:
+        - Response from Gemini
+        """
+        if not GEMINI_AVAILABLE:
+            return "Google Generative AI not available"
+        
+        cache_key = llm_cache.make_key(self.model, PROMPT_VERSION, prompt)
+        cached_response = llm_cache.get(cache_key)
+        if cached_response is not None:
+            return cached_response
+        
+        attempts = 0
+        last_exception = None
+        
+        while attempts < max_retries:
+            try:
+                # The rate limiter sleeps, keep that off the event loop
+                await asyncio.to_thread(self.rate_limiter.wait)
+                
+                response = await self._acall_gemini(prompt)
+                
+                self.rate_limiter.success()
+                
+                llm_cache.set(cache_key, response)
+                return response
+            except Exception as e:
+                last_exception = e
+                attempts += 1
+                
+                wait_time = self.rate_limiter.failure(e)
+                print(f"API error: {str(e)}. Retrying after {wait_time:.2f} seconds. Attempt {attempts}/{max_retries}")
+                await asyncio.sleep(wait_time)
+        
+        raise Exception(f"Maximum retries ({max_retries}) exceeded: {str(last_exception)}")
+    
+    async def _acall_gemini(self, prompt):
+        """
+        Call the Gemini API asynchronously with the given prompt
+        
+        Uses the REST endpoint over a shared connection pool when httpx is
+        installed, otherwise the google-generativeai async client.
+        
+        Parameters:
+        - prompt: The prompt for Gemini
+        
+        Returns:
+        - Response text from Gemini
+        """
+        try:
+            if gemini_http.HTTPX_AVAILABLE:
+                return await gemini_http.generate_content(self.api_key, self.model, prompt)
+            
+            response = await self.generative_model.generate_content_async(
+                prompt,
+                generation_config={"temperature": 0.0}
+            )
+            return response.text
+        except Exception as e:
+            raise Exception(f"Gemini API call failed: {str(e)}")
+    
+    def stream_call_gemini(self, prompt):
+        """
+        Call the Gemini API and yield the response text as it arrives
+        
+        Streamed responses are not cached, callers usually stop reading as soon
+        as they have what they need and cache the parsed result themselves.
+        
+        Parameters:
+        - prompt: The prompt for Gemini
+        
+        Returns:
+        - Generator of response text chunks from Gemini
+        """
+        if not GEMINI_AVAILABLE:
+            yield "Google Generative AI not available"
+            return
+        
+        # Wait according to rate limiter
+        self.rate_limiter.wait()
+        
+        try:
+            response = self.generative_model.generate_content(
+                prompt,
+                generation_config={"temperature": 0.0},
+                stream=True
+            )
+            for chunk in response:
+                yield chunk.text
+        except GeneratorExit:
+            # Closed by the caller before the end of the response
+            self.rate_limiter.success()
+            raise
+        except Exception as e:
+            self.rate_limiter.failure(e)
+            raise Exception(f"Gemini API call failed: {str(e)}")
+        
+        self.rate_limiter.success()
+    
+    def submit_documents_batch(self, file_paths, user_filters=None, texts=None):
+        """
+        Submit documents for analysis as a single Gemini Batch API job
+        
+        Batch jobs cost half as much as live requests and are not subject to
+        the per-minute rate limits, but can take up to 24 hours to complete.
+        This returns as soon as the job has been created, its results are
+        collected with get_documents_batch_results.
+        
+        Parameters:
+        - file_paths: List of paths to the document files
+        - user_filters: Optional dictionary containing user's filter preferences
+        - texts: Optional dictionary mapping file paths to already extracted text
+        
+        Returns:
+        - JSON serializable dictionary describing the job: its name (None if no
+          request could be built), the document of each request key, the errors
+          of documents that could not be sent and the submission time
+        """
+        if not BATCH_API_AVAILABLE:
+            raise RuntimeError("Google GenAI package not available. Install with pip install google-genai")
+        
+        keys = {}
+        errors = {}
+        texts = texts or {}
+        
+        # Write one request per document to a JSONL file
+        with tempfile.NamedTemporaryFile('wb', suffix='.jsonl', delete=False) as requests_file:
+            for index, file_path in enumerate(file_paths):
+                try:
+                    _, prompt = self._create_analysis_prompt(file_path, user_filters, texts.get(file_path))
+                except Exception as e:
+                    errors[file_path] = str(e)
+                    continue
+                
+                key = str(index)
+                keys[key] = file_path
+                requests_file.write(_json_dumps({
+                    "key": key,
+                    "request": {
+                        "contents": [{"parts": [{"text": prompt}]}],
+                        "generation_config": {"temperature": 0.0}
+                    }
+                }) + b"\n")
+        
+        job = {"name": None, "keys": keys, "errors": errors, "submitted": time.time()}
+        try:
+            if not keys:
+                return job
+            
+            client = genai_batch.Client(api_key=self.api_key)
+            uploaded_file = client.files.upload(
+                file=requests_file.name,
+                config={"display_name": "resume-batch-requests", "mime_type": "jsonl"}
+            )
+            job["name"] = client.batches.create(
+                model=BATCH_MODEL,
+                src=uploaded_file.name,
+                config={"display_name": "resume-batch"}
+            ).name
+        finally:
+            os.remove(requests_file.name)
+        
+        return job
+    
+    def get_documents_batch_results(self, job, user_filters=None):
+        """
+        Check a job from submit_documents_batch, collecting its results once it has finished
+        
+        Parameters:
+        - job: Job dictionary returned by submit_documents_batch
+        - user_filters: Filter preferences the job was submitted with
+        
+        Returns:
+        - Tuple of the job state and a dictionary mapping each file path to its
+          extracted information, or None while the job is still running
+        
+        Raises:
+        - TimeoutError if the job has run for longer than BATCH_MAX_WAIT, it is cancelled
+        - RuntimeError if the job ended without results
+        """
+        results = {file_path: self._error_result(file_path, error, user_filters)
+                   for file_path, error in job["errors"].items()}
+        if job["name"] is None:
+            return "JOB_STATE_SUCCEEDED", results
+        
+        client = genai_batch.Client(api_key=self.api_key)
+        batch_job = client.batches.get(name=job["name"])
+        state = batch_job.state.name
+        
+        if state not in BATCH_TERMINAL_STATES:
+            if time.time() - job["submitted"] > BATCH_MAX_WAIT:
+                client.batches.cancel(name=job["name"])
+                raise TimeoutError(f"Batch job {job['name']} did not finish within {BATCH_MAX_WAIT} seconds")
+            return state, None
+        
+        if state not in ("JOB_STATE_SUCCEEDED", "JOB_STATE_PARTIALLY_SUCCEEDED"):
+            raise RuntimeError(f"Batch job {job['name']} ended with state {state}: {batch_job.error}")
+        
+        # Map each response back to its document using the request key
+        keys = dict(job["keys"])
+        output = client.files.download(file=batch_job.dest.file_name)
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            
+            item = _json_loads(line)
+            file_path = keys.pop(item.get("key"), None)
+            if file_path is None:
+                continue
+            
+            try:
+                if item.get("error"):
+                    raise Exception(f"Gemini API call failed: {item['error']}")
+                
+                parts = item["response"]["candidates"][0]["content"]["parts"]
+                extracted_info = self._parse_response("".join(part.get("text", "") for part in parts))
+                extracted_info['filename'] = os.path.basename(file_path)
+                extracted_info['file_path'] = file_path
+                extracted_info['_extracted_text'] = _document_text(file_path)
+            except Exception as e:
+                extracted_info = self._error_result(file_path, e, user_filters)
+            
+            results[file_path] = extracted_info
+        
+        for file_path in keys.values():
+            results[file_path] = self._error_result(file_path, "No response returned by the batch job", user_filters)
+        
+        return state, results
+    
+    def _create_analysis_prompt(self, file_path, user_filters=None, text=None):
         """
-        Analyze a document using Gemini with structured output
+        Extract a document's text and create the prompt used to analyze it
         
         Parameters:
         - file_path: Path to the document file
+        - user_filters: Optional dictionary containing user's filter preferences
+        - text: Optional text already extracted from the file
         
         Returns:
-        - Extracted information as a dictionary
+        - Tuple of the extracted text and the prompt for Gemini
         """
-        if not GEMINI_AVAILABLE:
-            return {
-                'name': "Error: Google Generative AI not available",
-                'email': '',
-                'phone': '',
-                'education': '',
-                'experience': 0,
-                'skills': '',
-                'location': '',
-                'filename': os.path.basename(file_path),
-                'file_path': file_path,
-                'error': "Google Generative AI package not installed"
-            }
-            
-        try:
-            # Get the filename without extension (may contain candidate name)
-            filename = os.path.basename(file_path)
-            name_from_filename = os.path.splitext(filename)[0].replace('_', ' ').replace('-', ' ')
-            
-            # Extract text from file 
-            text = get_text_from_file(file_path)
-            
-            # Trim text if it's too long for the Gemini API
-            if len(text) > 30000:  
-                print(f"Warning: Document {file_path} is very long ({len(text)} chars). Truncating.")
-                text = text[:30000]
-            
-            # Check if text extraction was successful
-            if not text or len(text) < 50:
-                raise ValueError(f"Failed to extract meaningful text from {file_path}. Text length: {len(text)}")
-            
-            # Prepare the prompt for resume parsing
-            prompt = self._create_resume_parsing_prompt(text, name_from_filename)
-            
-            # Call Gemini API with retry logic
-            response = self._call_gemini_with_retry(prompt)
-            
-            # Parse the response
-            extracted_info = self._parse_response(response)
-            
-            # Add filename and file path for reference
-            extracted_info['filename'] = os.path.basename(file_path)
-            extracted_info['file_path'] = file_path
-            
-            return extracted_info
-        except Exception as e:
-            print(f"Error analyzing document {file_path}: {e}")
-            # Return a structured error object
-            return {
-                'name': f"Error: {str(e)[:50]}...",
-                'email': '',
-                'phone': '',
-                'education': '',
-                'experience': 0,
-                'skills': '',
-                'location': '',
-                'filename': os.path.basename(file_path),
-                'file_path': file_path,
-                'error': str(e)
-            }
-    
-    def analyze_document_with_filters(self, file_path, user_filters):
+        name_from_filename = _file_names(file_path)[1].replace('_', ' ').replace('-', ' ')
+        
+        text = self._prepare_text(file_path, text)
+        
+        if user_filters:
+            return text, self._create_resume_parsing_prompt_with_filters(text, user_filters, name_from_filename)
+        return text, self._create_resume_parsing_prompt(text, name_from_filename)
+    
+    def _prepare_text(self, file_path, text=None):
         """
-        Analyze a document using Gemini, incorporating user filter preferences
+        Extract a document's text if needed, trimmed to the size sent to Gemini
         
         Parameters:
         - file_path: Path to the document file
-        - user_filters: Dictionary containing user's filter preferences
+        - text: Optional text already extracted from the file
         
         Returns:
-        - Extracted information as a dictionary with match score
+        - The document text
         """
-        if not GEMINI_AVAILABLE:
-            return {
-                'name': "Error: Google Generative AI not available",
-                'email': '',
-                'phone': '',
-                'education': '',
-                'experience': 0,
-                'skills': '',
-                'location': '',
-                'match_score': 0,
-                'filename': os.path.basename(file_path),
-                'file_path': file_path,
-                'error': "Google Generative AI package not installed"
-            }
-            
-        try:
-            # Get the filename without extension (may contain candidate name)
-            filename = os.path.basename(file_path)
-            name_from_filename = os.path.splitext(filename)[0].replace('_', ' ').replace('-', ' ')
-            
-            # Extract text from file
-            text = get_text_from_file(file_path)
-            
-            if len(text) > 30000:
-                text = text[:30000]
-            
-            if not text or len(text) < 50:
-                raise ValueError(f"Failed to extract meaningful text from {file_path}.")
-            
-            # Create prompt with filters
-            prompt = self._create_resume_parsing_prompt_with_filters(text, user_filters, name_from_filename)
-            
-            # Call Gemini API with retry logic
-            response = self._call_gemini_with_retry(prompt)
-            
-            # Parse response
-            extracted_info = self._parse_response(response)
-            
-            # Add file info
-            extracted_info['filename'] = os.path.basename(file_path)
-            extracted_info['file_path'] = file_path
-            
-            return extracted_info
-        except Exception as e:
-            print(f"Error analyzing document with filters {file_path}: {e}")
-            return {
-                'name': f"Error: {str(e)[:50]}...",
-                'email': '',
-                'phone': '',
-                'education': '',
-                'experience': 0,
-                'skills': '',
-                'location': '',
-                'match_score': 0,
-                'filename': os.path.basename(file_path),
-                'file_path': file_path,
-                'error': str(e)
-            }
+        if text is None:
+            text = _document_text(file_path)
+        
+        # Trim text if it's too long for the Gemini API
+        if len(text) > MAX_DOCUMENT_CHARS:
+            print(f"Warning: Document {file_path} is very long ({len(text)} chars). Truncating.")
+            text = _trim_text(text)
+        
+        # Check if text extraction was successful
+        if not text or len(text) < 50:
+            raise ValueError(f"Failed to extract meaningful text from {file_path}. Text length: {len(text)}")
+        
+        return text
     
-    def _call_gemini_with_retry(self, prompt, max_retries=3):
+    def _unmatched_result(self, file_path, filename, text, user_filters):
         """
-        Call Gemini API with retries and backoff
+        Create the result for a document that mentions none of the required skills,
+        without asking Gemini
         
         Parameters:
-        - prompt: The prompt for Gemini
-        - max_retries: Maximum number of retry attempts
+        - file_path: Path to the document file
+        - filename: File name of the document
+        - text: The document text
+        - user_filters: Dictionary containing user's filter preferences
         
         Returns:
-        - Response from Gemini
+        - Information as a dictionary with a zero match score
         """
-        if not GEMINI_AVAILABLE:
-            return "Google Generative AI not available"
-            
-        attempts = 0
-        last_exception = None
-        
-        while attempts < max_retries:
-            try:
-                # Wait according to rate limiter
-                self.rate_limiter.wait()
-                
-                # Call Gemini
-                response = self._call_gemini(prompt)
-                
-                # Update rate limiter on success
-                self.rate_limiter.success()
-                
-                return response
-            except Exception as e:
-                last_exception = e
-                attempts += 1
-                
-                # Update rate limiter and wait before retry
-                wait_time = self.rate_limiter.failure()
-                print(f"API error: {str(e)}. Retrying after {wait_time:.2f} seconds. Attempt {attempts}/{max_retries}")
-                time.sleep(wait_time)
-        
-        # If all retries fail, raise the exception
-        raise Exception(f"Maximum retries ({max_retries}) exceeded: {str(last_exception)}")
+        skills = ', '.join(str(skill) for skill in user_filters['skills'])
+        extracted_info = self._normalize_info({
+            'name': extract_name_from_file(file_path) or "Unknown",
+            'gap_analysis': [f"None of the required skills were found in the resume: {skills}"]
+        })
+        extracted_info['filename'] = filename
+        extracted_info['file_path'] = file_path
+        extracted_info['_extracted_text'] = text
+        return extracted_info
     
-    def _call_gemini(self, prompt):
+    def _error_result(self, file_path, error, user_filters=None):
         """
-        Call the Gemini API with the given prompt
+        Create the structured error object returned for a document that failed
         
         Parameters:
-        - prompt: The prompt for Gemini
+        - file_path: Path to the document file
+        - error: Exception or message describing the failure
+        - user_filters: Optional dictionary containing user's filter preferences
         
         Returns:
-        - Response text from Gemini
+        - Error information as a dictionary
         """
-        if not GEMINI_AVAILABLE:
-            return "Google Generative AI not available"
-            
-        try:
-            model = genai.GenerativeModel(self.model)
-            response = model.generate_content(
-                prompt,
-                generation_config={"temperature": 0.0}
-            )
-            return response.text
-        except Exception as e:
-            raise Exception(f"Gemini API call failed: {str(e)}")
+        result = _ERROR_RESULT_TEMPLATE.copy()
+        result['name'] = f"Error: {str(error)[:50]}..."
+        result['filename'] = os.path.basename(file_path)
+        result['file_path'] = file_path
+        result['error'] = str(error)
+        if user_filters:
+            result['match_score'] = 0
+        return result
     
-    def queue_document_for_analysis(self, file_path, user_filters=None):
+    def queue_document_for_analysis(self, file_path, user_filters=None, callback=None, text=None, decompose=False):
         """
         Queue a document for asynchronous analysis
         
         Parameters:
         - file_path: Path to the document file
         - user_filters: Optional dictionary containing user's filter preferences
+        - callback: Optional function called with the task ID when analysis finishes
+        - text: Optional text already extracted from the file
+        - decompose: If True, analyze the document with several smaller prompts in parallel
         
         Returns:
         - Task ID for checking result status
         """
-        return self.queue.add_task(file_path, user_filters)
+        return self.queue.add_task(file_path, user_filters, callback, text, decompose)
     
     def get_queued_result(self, task_id):
         """
@@ -418,138 +1371,86 @@ class GeminiProcessor:
         """
         Create a prompt for Gemini to extract information from a resume
         """
-        name_hint_text = ""
-        if name_hint:
-            name_hint_text = f"\nHINT: The candidate's name might be '{name_hint}' based on the filename."
-            
-        prompt = f"""You are an expert resume parser with extensive experience in HR and technical recruiting. Extract precise information from this resume:{name_hint_text}
-
-# EXTRACTION GUIDELINES:
-
-## Personal Information
-1. Name: Extract the full name
-2. Email: Extract complete email address
-3. Phone: Extract phone number with formatting
-4. Location: Extract city, state/province, country information
-
-## Professional Details
-5. Work Experience:
-   - Calculate total years of experience (round to nearest whole number)
-   - Count internships as valid experience
-   - Identify all companies and positions held
-   - Extract dates of employment
-   - Note key responsibilities and achievements
-
-6. Education:
-   - Extract all degrees, major fields of study
-   - Extract educational institutions
-   - Extract graduation years
-   - Note any academic honors or GPA if mentioned
-
-7. Technical Information:
-   - Skills: Extract ALL technical skills mentioned anywhere in the resume
-   - Languages: Extract all programming and human languages with proficiency levels
-   - Certifications: Extract all professional certifications
-
-# FORMAT REQUIREMENTS:
-
-Create a clean, structured JSON object with these exact fields:
-{{
-  "name": string (full name),
-  "email": string (complete email),
-  "phone": string (full phone number),
-  "location": string (complete location details),
-  "experience": number (total years as integer),
-  "work_history": Array of objects with company, position, dates, and responsibilities,
-  "education": Array of objects with degree, institution, year, and field of study,
-  "skills": Array of strings (all technical skills),
-  "linkedin": string (complete URL or empty string if not present),
-  "github": string (complete URL or empty string if not present),
-  "languages": Array of objects with language name and proficiency level,
-  "certifications": Array of strings (all certifications)  
-}}
-
-Your output must be ONLY the JSON object without any additional text. Ensure the JSON is valid and properly formatted.
-
-RESUME TEXT:
-{resume_text}
-"""
-        return prompt
+        return "".join((_PARSING_PROMPT_INTRO, self._create_name_hint(name_hint),
+                        _PARSING_PROMPT_BODY, _PARSING_PROMPT_OUTPUT, resume_text, "\n"))
     
     def _create_resume_parsing_prompt_with_filters(self, resume_text, user_filters, name_hint=None):
         """
         Create an enhanced prompt for Gemini to extract information and provide matching analysis
         """
-        # Build filter context string
-        filter_context = "The evaluator is specifically looking for candidates with these qualifications:\n"
+        return "".join((_FILTER_PROMPT_INTRO, self._create_name_hint(name_hint),
+                        _FILTER_PROMPT_REQUIREMENTS, self._create_filter_context(user_filters),
+                        _FILTER_PROMPT_BODY, _RESUME_TEXT_FOOTER, resume_text, "\n"))
+    
+    def _create_multi_resume_prompt(self, resume_texts, user_filters=None, name_hints=None):
+        """
+        Create a prompt for Gemini to extract information from several resumes at once
+        """
+        if user_filters:
+            parts = [_FILTER_PROMPT_INTRO, _FILTER_PROMPT_REQUIREMENTS,
+                     self._create_filter_context(user_filters), _FILTER_PROMPT_BODY]
+        else:
+            parts = [_PARSING_PROMPT_INTRO, _PARSING_PROMPT_BODY]
+        parts.append(_MULTI_RESUME_PROMPT_OUTPUT.format(count=len(resume_texts)))
+        
+        for number, resume_text in enumerate(resume_texts, 1):
+            name_hint = name_hints[number - 1] if name_hints else None
+            parts.extend((f"\n## RESUME {number}", self._create_name_hint(name_hint), "\n", resume_text, "\n"))
+        
+        return "".join(parts)
+    
+    def _create_name_hint(self, name_hint):
+        """
+        Describe the candidate name guessed from the filename for a prompt
+        """
+        if not name_hint:
+            return ""
+        return _NAME_HINT_TEMPLATE.format(name_hint)
+    
+    def _create_filter_context(self, user_filters):
+        """
+        Describe the user's filter preferences for an evaluation prompt
+        """
+        # Build filter context lines
+        lines = ["The evaluator is specifically looking for candidates with these qualifications:\n"]
         
         if user_filters.get('skills'):
-            filter_context += f"- Skills required: {', '.join(user_filters['skills'])}\n"
+            lines.append(f"- Skills required: {', '.join(user_filters['skills'])}\n")
         
         if user_filters.get('min_experience', 0) > 0:
-            filter_context += f"- Minimum experience: {user_filters['min_experience']} years\n"
+            lines.append(f"- Minimum experience: {user_filters['min_experience']} years\n")
         
         if user_filters.get('education_level') and user_filters['education_level'] != "Any":
-            filter_context += f"- Education level: {user_filters['education_level']} or higher\n"
+            lines.append(f"- Education level: {user_filters['education_level']} or higher\n")
         
         if user_filters.get('location'):
-            filter_context += f"- Location preference: {user_filters['location']}\n"
+            lines.append(f"- Location preference: {user_filters['location']}\n")
         
         if user_filters.get('custom_filters'):
             for key, value in user_filters['custom_filters'].items():
                 if value:
-                    filter_context += f"- {key}: {value}\n"
+                    lines.append(f"- {key}: {value}\n")
         
-        name_hint_text = ""
-        if name_hint:
-            name_hint_text = f"\nHINT: The candidate's name might be '{name_hint}' based on the filename."
+        return "".join(lines)
+    
+    def _create_sub_prompts(self, resume_text, user_filters=None, name_hint=None):
+        """
+        Create smaller prompts that together extract the same fields as the
+        single resume parsing prompt: contact details, experience and education,
+        and skills with the match evaluation when filters are given
+        """
+        footer = "".join((_RESUME_TEXT_FOOTER, resume_text, "\n"))
         
-        prompt = f"""You are an expert resume parser and talent evaluator. Extract precise information from this resume and evaluate how well the candidate matches the job requirements.{name_hint_text}
-
-# JOB REQUIREMENTS - IMPORTANT
-{filter_context}
-Pay special attention to these requirements throughout your analysis.
-
-# RESUME EXTRACTION GUIDELINES:
-1. Extract all personal information accurately (name, email, phone, location)
-2. Calculate total years of experience (include internships)
-3. Extract all education details (degrees, institutions, years, fields of study)
-4. Extract ALL technical skills mentioned throughout the resume, including in project descriptions
-5. Extract work history with dates, companies, positions, and key responsibilities
-6. Extract languages, certifications, and online profiles
-
-# CANDIDATE EVALUATION GUIDELINES:
-1. Give a precise match score from 0-100 based on how well the candidate matches the job requirements
-2. Provide 3-5 specific reasons why the candidate is a good match, with concrete examples from their resume
-3. Identify any gaps between the candidate's qualifications and the job requirements
-4. Be objective and evidence-based in your evaluation
-
-# FORMAT REQUIREMENTS:
-Create a clean JSON object with these exact fields:
-{{
-  "name": string (full name),
-  "email": string (complete email),
-  "phone": string (full phone number),
-  "location": string (complete location details),
-  "experience": number (total years as integer),
-  "work_history": Array of objects with company, position, dates, and responsibilities,
-  "education": Array of objects with degree, institution, year, and field of study,
-  "skills": Array of strings (all technical skills),
-  "linkedin": string (complete URL),
-  "github": string (complete URL),
-  "languages": Array of objects with language name and proficiency level,
-  "certifications": Array of strings (all certifications),
-  "match_score": number between 0-100 representing how well this candidate matches the requirements,
-  "match_reasons": Array of strings explaining why this candidate is a good match (with specific examples),
-  "gap_analysis": Array of strings identifying skills or qualifications the candidate is missing
-}}
-
-Your output must be ONLY the JSON object without any additional text. Ensure the JSON is valid.
-
-RESUME TEXT:
-{resume_text}
-"""
-        return prompt
+        basic_info_prompt = "".join((_BASIC_INFO_PROMPT_INTRO, self._create_name_hint(name_hint),
+                                     _BASIC_INFO_PROMPT_BODY, footer))
+        experience_prompt = _EXPERIENCE_PROMPT + footer
+        
+        if not user_filters:
+            return [basic_info_prompt, experience_prompt, _SKILLS_PROMPT + footer]
+        
+        match_prompt = "".join((_MATCH_PROMPT_INTRO, self._create_filter_context(user_filters),
+                                _MATCH_PROMPT_BODY, footer))
+        return [basic_info_prompt, experience_prompt, match_prompt]
     
     def _parse_response(self, response):
         """
@@ -558,133 +1459,124 @@ RESUME TEXT:
         Parameters:
         - response: The JSON response from Gemini
         
+        Returns:
+        - Extracted information as a dictionary
+        """
+        return self._parse_responses([response])
+    
+    def _parse_responses(self, responses):
+        """
+        Parse and merge the JSON objects in one or more responses from Gemini
+        
+        Parameters:
+        - responses: List of JSON responses from Gemini
+        
         Returns:
         - Extracted information as a dictionary
         """
         try:
-            # Find the JSON object in the response
-            json_start = response.find('{')
-            json_end = response.rfind('}') + 1
+            extracted_info = {}
+            for response in responses:
+                extracted_info.update(self._extract_json(response))
             
-            if json_start >= 0 and json_end > json_start:
-                json_str = response[json_start:json_end]
-                extracted_info = json.loads(json_str)
-                
-                # Ensure all required fields are present
-                required_fields = ['name', 'email', 'phone', 'location', 'experience', 
-                                  'skills', 'work_history', 'education', 'linkedin', 'github', 
-                                  'languages', 'certifications']
-                
-                for field in required_fields:
-                    if field not in extracted_info:
-                        if field in ['work_history', 'education', 'skills', 'languages', 'certifications', 'match_reasons', 'gap_analysis']:
-                            extracted_info[field] = []
-                        else:
-                            extracted_info[field] = ""
-                
-                # Ensure experience is numeric
-                try:
-                    extracted_info['experience'] = int(extracted_info['experience']) if extracted_info.get('experience') is not None else 0
-                except (ValueError, TypeError):
-                    extracted_info['experience'] = 0
-                
-                # Format array fields to strings for compatibility with existing code
-                if isinstance(extracted_info.get('skills', []), list):
-                    extracted_info['skills'] = ', '.join(extracted_info.get('skills', []))
-                
-                # Format education array into a string
-                if isinstance(extracted_info.get('education', []), list):
-                    education_parts = []
-                    for edu in extracted_info.get('education', []):
-                        if isinstance(edu, dict):
-                            edu_str = ""
-                            if 'degree' in edu:
-                                edu_str += edu['degree']
-                            if 'institution' in edu:
-                                if edu_str:
-                                    edu_str += " from "
-                                edu_str += edu['institution']
-                            if 'year' in edu:
-                                edu_str += f" ({edu['year']})"
-                            if 'field' in edu:
-                                edu_str += f", {edu['field']}"
-                            education_parts.append(edu_str)
-                    extracted_info['education'] = "; ".join(education_parts)
-                
-                # Format languages array into a string
-                if isinstance(extracted_info.get('languages', []), list):
-                    language_parts = []
-                    for lang in extracted_info.get('languages', []):
-                        if isinstance(lang, dict) and 'name' in lang:
-                            lang_str = lang['name']
-                            if 'proficiency' in lang:
-                                lang_str += f" ({lang['proficiency']})"
-                            language_parts.append(lang_str)
-                        elif isinstance(lang, str):
-                            language_parts.append(lang)
-                    extracted_info['languages'] = ", ".join(language_parts)
-                
-                # Format certifications array into a string
-                if isinstance(extracted_info.get('certifications', []), list):
-                    extracted_info['certifications'] = ", ".join(extracted_info.get('certifications', []))
-                
-                # Add a formatted work history summary
-                if isinstance(extracted_info.get('work_history', []), list) and extracted_info.get('work_history', []):
-                    work_history_parts = []
-                    for job in extracted_info.get('work_history', []):
-                        if isinstance(job, dict):
-                            job_str = ""
-                            if 'position' in job:
-                                job_str += job['position']
-                            if 'company' in job:
-                                if job_str:
-                                    job_str += " at "
-                                job_str += job['company']
-                            if 'dates' in job:
-                                job_str += f" ({job['dates']})"
-                            work_history_parts.append(job_str)
-                    extracted_info['work_history_summary'] = "; ".join(work_history_parts)
-                else:
-                    extracted_info['work_history_summary'] = ""
-                
-                # Format match reasons into a string if present
-                if 'match_reasons' in extracted_info and isinstance(extracted_info.get('match_reasons', []), list):
-                    extracted_info['match_reasons_text'] = "- " + "\n- ".join(extracted_info.get('match_reasons', []))
-                else:
-                    extracted_info['match_reasons_text'] = ""
-                
-                # Format gap analysis into a string if present
-                if 'gap_analysis' in extracted_info and isinstance(extracted_info.get('gap_analysis', []), list) and extracted_info.get('gap_analysis', []):
-                    extracted_info['gap_analysis_text'] = "Areas for improvement:\n- " + "\n- ".join(extracted_info.get('gap_analysis', []))
-                else:
-                    extracted_info['gap_analysis_text'] = "No significant gaps identified."
-                    
-                # Ensure match score is present
-                if 'match_score' not in extracted_info:
-                    extracted_info['match_score'] = 0
-                
-                return extracted_info
-            else:
-                raise ValueError("No JSON object found in response")
+            return self._normalize_info(extracted_info)
         except Exception as e:
             print(f"Error parsing Gemini response: {e}")
-            return {
-                'name': 'Unknown',
-                'email': '',
-                'phone': '',
-                'education': '',
-                'experience': 0,
-                'skills': '',
-                'location': '',
-                'linkedin': '',
-                'github': '',
-                'languages': '',
-                'certifications': '',
-                'work_history': [],
-                'work_history_summary': '',
-                'match_score': 0,
-                'match_reasons': [],
-                'match_reasons_text': '',
-                'gap_analysis': [],
-                'gap_analysis_text': 'No analysis available.'
-            }
\ No newline at end of file
+            result = _UNPARSED_RESULT_TEMPLATE.copy()
+            result.update(work_history=[], match_reasons=[], gap_analysis=[])
+            return result
+    
+    def _parse_batch_response(self, response, count):
+        """
+        Parse the JSON array in a multi-resume response from Gemini
+        
+        Parameters:
+        - response: The JSON response from Gemini
+        - count: Number of resumes in the request
+        
+        Returns:
+        - List of extracted information dictionaries, None for resumes missing
+          from the response or given by more than one object
+        """
+        if isinstance(response, str):
+            response = response.encode('utf-8')
+        
+        match = _JSON_ARRAY_RE.search(response)
+        items = _json_loads(match.group(0)) if match else []
+        if not isinstance(items, list):
+            items = []
+        
+        # Objects are matched to resumes by their "index" field, not their position,
+        # so a skipped or reordered object can't be attached to the wrong resume
+        by_number = {}
+        duplicates = set()
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            number = item.pop('index', None)
+            if not isinstance(number, int) or isinstance(number, bool):
+                continue
+            if number in by_number:
+                duplicates.add(number)
+            by_number[number] = item
+        
+        results = []
+        for number in range(1, count + 1):
+            item = by_number.get(number) if number not in duplicates else None
+            try:
+                results.append(self._normalize_info(item) if item is not None else None)
+            except Exception:
+                results.append(None)
+        return results
+    
+    def _normalize_info(self, extracted_info):
+        """
+        Fill in missing fields of a parsed response and format its list fields
+        
+        Parameters:
+        - extracted_info: Dictionary decoded from a Gemini response
+        
+        Returns:
+        - Extracted information as a dictionary
+        """
+        # Start from the template so missing fields get their defaults
+        info = _RESULT_TEMPLATE.copy()
+        info.update(extracted_info)
+        if 'work_history' not in info:
+            info['work_history'] = []
+        
+        for field, text_field, formatter in _LIST_FIELD_FORMATS:
+            value = info.get(field)
+            if text_field:
+                info[text_field] = formatter(value if isinstance(value, list) else [])
+            elif isinstance(value, list):
+                info[field] = formatter(value)
+        
+        # Ensure experience is numeric
+        experience = info['experience']
+        try:
+            info['experience'] = int(experience) if experience is not None else 0
+        except (ValueError, TypeError):
+            info['experience'] = 0
+        
+        return info
+    
+    def _extract_json(self, response):
+        """
+        Extract the JSON object from a response from Gemini
+        
+        Parameters:
+        - response: The JSON response from Gemini, as text or UTF-8 bytes
+        
+        Returns:
+        - Decoded JSON object
+        """
+        # Search the encoded bytes, the JSON parser takes the match as is
+        if isinstance(response, str):
+            response = response.encode('utf-8')
+        
+        # Find the JSON object in the response, including inside ```json fences
+        match = _JSON_OBJECT_RE.search(response)
+        if match:
+            return _json_loads(match.group(0))
+        raise ValueError("No JSON object found in response")
\ No newline at end of file
@@ -0,0 +1,148 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from utils.session_store import SNAPSHOT_MAX_AGE
+
+# Directory holding one JSON file per cached response
+CACHE_DIR = Path("data/llm_cache")
+
+# Number of recently used responses also kept in memory, in front of the disk cache
+MEMORY_CACHE_SIZE = 512
+
+# Responses contain candidate contact details, so they are kept no longer than session snapshots
+MAX_AGE = SNAPSHOT_MAX_AGE
+
+# Maximum number of responses kept on disk, the least recently written are deleted first
+MAX_ENTRIES = 10000
+
+# Seconds between sweeps of the disk cache for expired entries
+SWEEP_INTERVAL = 3600
+
+_memory_cache = OrderedDict()
+_memory_lock = threading.Lock()
+_last_sweep = 0.0
+
+def make_key(*parts):
+    """
+    Build a cache key from the inputs that determine an LLM response
+    
+    Each part is length-prefixed before hashing so that different splits of
+    the same bytes (e.g. model "ab" + prompt "c" vs "a" + "bc") never collide.
+    
+    Args:
+        *parts: Strings such as the model name, prompt version and prompt,
+            or UTF-8 bytes which are hashed without encoding them again
+        
+    Returns:
+        str: 128-bit BLAKE2b hex digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        data = part if isinstance(part, bytes) else part.encode('utf-8')
+        digest.update(len(data).to_bytes(8, 'big'))
+        digest.update(data)
+    return digest.hexdigest()
+
+def _cache_path(key):
+    return CACHE_DIR / key[:2] / f"{key}.json"
+
+def _remember(key, value, stored_time):
+    with _memory_lock:
+        _memory_cache[key] = (stored_time, value)
+        _memory_cache.move_to_end(key)
+        if len(_memory_cache) > MEMORY_CACHE_SIZE:
+            _memory_cache.popitem(last=False)
+
+def get(key):
+    """
+    Look up a cached response, in memory first and then on disk
+    
+    Args:
+        key: Key created with make_key
+        
+    Returns:
+        The cached value, or None if it is not cached or has expired
+    """
+    cutoff = time.time() - MAX_AGE
+    with _memory_lock:
+        if key in _memory_cache:
+            stored_time, value = _memory_cache[key]
+            if stored_time >= cutoff:
+                _memory_cache.move_to_end(key)
+                return value
+            del _memory_cache[key]
+    
+    path = _cache_path(key)
+    try:
+        stored_time = path.stat().st_mtime
+        if stored_time < cutoff:
+            path.unlink()
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            value = json.load(f)["value"]
+    except (OSError, ValueError, KeyError):
+        return None
+    
+    _remember(key, value, stored_time)
+    return value
+
+def set(key, value):
+    """
+    Store a response in the cache
+    
+    Args:
+        key: Key created with make_key
+        value: JSON serializable value to store
+    """
+    _remember(key, value, time.time())
+    
+    path = _cache_path(key)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Write to a temporary file first so readers never see a partial entry.
+        # Each writer gets its own file, queue worker threads can store the same key at once.
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=path.parent,
+                                         suffix='.tmp', delete=False) as f:
+            json.dump({"value": value}, f)
+        os.replace(f.name, path)
+    except OSError as e:
+        print(f"Error writing LLM cache entry {key}: {e}")
+    
+    global _last_sweep
+    with _memory_lock:
+        due = time.time() - _last_sweep >= SWEEP_INTERVAL
+        if due:
+            _last_sweep = time.time()
+    if due:
+        remove_expired_entries()
+
+def remove_expired_entries():
+    """
+    Delete responses written more than MAX_AGE seconds ago, then the oldest
+    ones until at most MAX_ENTRIES are left on disk
+    """
+    cutoff = time.time() - MAX_AGE
+    entries = []
+    for path in CACHE_DIR.glob("*/*"):
+        try:
+            modified_time = path.stat().st_mtime
+            # Temporary files left behind by interrupted writes expire the same way
+            if modified_time < cutoff:
+                path.unlink()
+            elif path.suffix == '.json':
+                entries.append((modified_time, path))
+        except FileNotFoundError:
+            pass
+    
+    entries.sort()
+    for _, path in entries[:max(len(entries) - MAX_ENTRIES, 0)]:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
@@ -1,96 +1,121 @@
 import streamlit as st
 from pathlib import Path
+from types import MappingProxyType
 import os
+import threading
+
+# Bound once, skips the os.getenv wrapper
+_env_get = os.environ.get
+
+# Set by hosting platforms (Render, Heroku, Streamlit Cloud), where no local secrets file is used
+HOSTED_ENV_VARS = ('RENDER', 'DYNO', 'STREAMLIT_SHARING_MODE')
+
+# API key in the template secrets file, it doesn't count as a configured key
+API_KEY_PLACEHOLDER = "your_gemini_api_key_here"
+
+# Written to .streamlit/secrets.toml when it doesn't exist yet
+_SECRETS_TEMPLATE = f'# Google Gemini API credentials\n[gemini]\napi_key = "{API_KEY_PLACEHOLDER}"\n'.encode()
+
+def _is_hosted():
+    return any(_env_get(name) for name in HOSTED_ENV_VARS)
+
+# Secrets read by the first SecretsManager, shared read-only by every later one
+_resolved_sections = None
+_resolved_sections_lock = threading.Lock()
+
+def _resolve_sections(read_sections):
+    global _resolved_sections
+    if _resolved_sections is None:
+        with _resolved_sections_lock:
+            if _resolved_sections is None:
+                _resolved_sections = MappingProxyType({
+                    section: MappingProxyType(dict(values))
+                    for section, values in read_sections().items()
+                })
+    return _resolved_sections
 
 class SecretsManager:
     
+    # Set once the local secrets file is known to exist, it isn't removed while the app runs
+    _local_secrets_file_exists = False
+    
     def __init__(self):
-        self.sections = {}
+        # Environment variables don't change while the app runs, read the key once
+        self._env_api_key = _env_get('GEMINI_API_KEY')
         self.load_secrets()
     
     def load_secrets(self):
+        # Secrets don't change while the app runs, so they are only read once
+        self.sections = _resolve_sections(self._read_sections)
+        self._check_secrets()
+        # Neither the environment nor st.secrets had credentials, the UI can offer
+        # to create a local secrets file with prepare_local_secrets
+        self.needs_local_setup = not self.sections and not _is_hosted()
+    
+    def _read_sections(self):
         try:
             # First, check environment variables (for Render/other hosting platforms)
-            api_key_from_env = os.getenv('GEMINI_API_KEY')
-            
-            if api_key_from_env:
+            if self._env_api_key:
                 # Use environment variable if available
-                self.sections['gemini'] = {'api_key': api_key_from_env}
-                return
+                return {'gemini': {'api_key': self._env_api_key}}
             
-            # Then check Streamlit secrets (for Streamlit Cloud)
-            if hasattr(st, 'secrets'):
-                if 'gemini' in st.secrets:
-                    self.sections['gemini'] = st.secrets['gemini']
-                    return
-            else:
-                self._ensure_local_secrets_file()
-                
-                try:
-                    if 'gemini' in st.secrets:
-                        self.sections['gemini'] = st.secrets['gemini']
-                        return
-                except (KeyError, AttributeError):
-                    pass
+            # Then check Streamlit secrets (for Streamlit Cloud), st.secrets is
+            # only touched once and the section is copied into a plain dict
+            try:
+                return {'gemini': dict(st.secrets['gemini'])}
+            except (KeyError, FileNotFoundError, AttributeError):
+                pass
             
             # If no secrets found, warn user
             st.warning("Gemini API credentials not found in secrets or environment variables.")
-            self.sections = {}
         except Exception as e:
             st.error(f"Error loading secrets: {e}")
-            self.sections = {}
+        return {}
+    
+    def _check_secrets(self):
+        # Loaded secrets don't change, so which of them are usable is worked out once
+        self._valid_keys = frozenset(
+            (section, key)
+            for section, values in self.sections.items()
+            for key, value in values.items()
+            if value and value != API_KEY_PLACEHOLDER
+        )
     
     def get_secret(self, key, default=None, section='gemini'):
         # Check environment variable first (for Render)
-        if key == 'api_key' and section == 'gemini':
-            env_key = os.getenv('GEMINI_API_KEY')
-            if env_key:
-                return env_key
+        if key == 'api_key' and section == 'gemini' and self._env_api_key:
+            return self._env_api_key
                 
-        if section in self.sections:
-            return self.sections[section].get(key, default)
-        return default
+        values = self.sections.get(section)
+        return values.get(key, default) if values is not None else default
     
     def has_secrets(self, section='gemini'):
-        # Check environment variable first
-        if os.getenv('GEMINI_API_KEY'):
-            return True
-            
-        required_keys = ['api_key']
-        section_data = self.sections.get(section, {})
-        
-        return all(key in section_data 
-                  and section_data[key] 
-                  and section_data[key] != "your_gemini_api_key_here" 
-                  for key in required_keys)
+        return (section, 'api_key') in self._valid_keys
     
     def has_secret(self, key, section='gemini'):
-        # Check environment variable first
-        if key == 'api_key' and section == 'gemini':
-            if os.getenv('GEMINI_API_KEY'):
-                return True
-                
-        if section in self.sections:
-            return (key in self.sections[section] 
-                   and self.sections[section][key] 
-                   and self.sections[section][key] != "your_gemini_api_key_here")
-        return False
+        return (section, key) in self._valid_keys
     
-    def _ensure_local_secrets_file(self):
+    @classmethod
+    def prepare_local_secrets(cls):
+        # Creates a template .streamlit/secrets.toml, only called when the user asks for it
+        if cls._local_secrets_file_exists or _is_hosted():
+            return
+        
         secrets_dir = Path('.streamlit')
         secrets_file = secrets_dir / 'secrets.toml'
         
         if not secrets_file.exists():
             secrets_dir.mkdir(exist_ok=True)
-            
-            with open(secrets_file, 'w') as f:
-                f.write("""
-# Google Gemini API credentials
-[gemini]
-api_key = "your_gemini_api_key_here"
-                """)
+            secrets_file.write_bytes(_SECRETS_TEMPLATE)
             
             st.warning("""
             A template secrets.toml file has been created in the .streamlit directory.
-            Please edit this file to add your Gemini API key.
-            """)
\ No newline at end of file
+            Please edit this file to add your Gemini API key and restart the app.
+            """)
+        
+        cls._local_secrets_file_exists = True
+
+# Secrets don't change while the server runs, so every session and rerun shares one manager
+@st.cache_resource(show_spinner=False)
+def get_secrets_manager():
+    return SecretsManager()
\ No newline at end of file
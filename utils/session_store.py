@@ -0,0 +1,180 @@
+import re
+import json
+import time
+import uuid
+from pathlib import Path
+import streamlit as st
+
+# Directory holding one parquet snapshot of the processed resumes per session
+SNAPSHOT_DIR = Path("data/processed")
+
+# Snapshots are readable by anyone with the session link, so they are deleted
+# after this many seconds and never hold the candidates' contact details
+SNAPSHOT_MAX_AGE = 7 * 24 * 3600
+SNAPSHOT_EXCLUDED_FIELDS = frozenset(('email', 'phone', 'linkedin', 'github'))
+
+_SESSION_KEY_RE = re.compile(r'[0-9a-f]{32}')
+
+def new_session_key(requested_key=None):
+    """
+    Get the key identifying a session's snapshot
+    
+    Args:
+        requested_key: Key from the URL of a previous session, if any
+        
+    Returns:
+        str: The requested key if it is valid, otherwise a new random key
+    """
+    if requested_key and _SESSION_KEY_RE.fullmatch(requested_key):
+        return requested_key
+    return uuid.uuid4().hex
+
+def snapshot_path(session_key):
+    """Path of the parquet snapshot for a session"""
+    return SNAPSHOT_DIR / f"session_{session_key}.parquet"
+
+def batch_job_path(session_key):
+    """Path of the file recording a session's pending Gemini batch job"""
+    return SNAPSHOT_DIR / f"session_{session_key}.batch.json"
+
+def save_matches(matches, session_key):
+    """
+    Save processed resumes to the session's parquet snapshot
+    
+    Private fields (starting with "_") and contact details are left out, and
+    list or dict values are stored as JSON text. Expired snapshots of other
+    sessions are deleted at the same time.
+    
+    Args:
+        matches: List of resume data dictionaries
+        session_key: Key identifying the session
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        rows = []
+        json_columns = set()
+        for resume in matches:
+            row = {}
+            for key, value in resume.items():
+                if key.startswith('_') or key in SNAPSHOT_EXCLUDED_FIELDS:
+                    continue
+                if isinstance(value, (list, dict)):
+                    value = json.dumps(value, default=str)
+                    json_columns.add(key)
+                row[key] = value
+            rows.append(row)
+        
+        # Columns mixing text with other values are stored as text
+        columns = {}
+        for row in rows:
+            for key, value in row.items():
+                columns.setdefault(key, set()).add(type(value))
+        for key, types in columns.items():
+            types.discard(type(None))
+            if str in types and len(types) > 1:
+                for row in rows:
+                    if row.get(key) is not None:
+                        row[key] = str(row[key])
+        
+        table = pa.table({key: [row.get(key) for row in rows] for key in columns})
+        table = table.replace_schema_metadata({b'json_columns': json.dumps(sorted(json_columns)).encode()})
+        
+        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+        pq.write_table(table, snapshot_path(session_key), compression='zstd')
+        remove_expired_snapshots()
+    except Exception as e:
+        st.warning(f"Could not save the processed resumes for this session: {e}")
+
+def remove_expired_snapshots():
+    """Delete snapshots and batch job files that were last written more than SNAPSHOT_MAX_AGE seconds ago"""
+    cutoff = time.time() - SNAPSHOT_MAX_AGE
+    for path in SNAPSHOT_DIR.glob("session_*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+        except FileNotFoundError:
+            pass
+
+def load_matches(session_key):
+    """
+    Load the processed resumes saved for a session
+    
+    Args:
+        session_key: Key identifying the session
+        
+    Returns:
+        list: Resume data dictionaries, empty if nothing was saved or the snapshot has expired
+    """
+    path = snapshot_path(session_key)
+    try:
+        modified_time = path.stat().st_mtime
+        if modified_time < time.time() - SNAPSHOT_MAX_AGE:
+            path.unlink()
+            return []
+        return _read_snapshot(str(path), modified_time)
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        st.warning(f"Could not restore the processed resumes of this session: {e}")
+        return []
+
+def save_batch_job(batch, session_key):
+    """
+    Record a session's pending Gemini batch job, so that it is picked up again after a reload
+    
+    Args:
+        batch: JSON serializable dictionary describing the job
+        session_key: Key identifying the session
+    """
+    try:
+        SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+        batch_job_path(session_key).write_text(json.dumps(batch), encoding='utf-8')
+    except Exception as e:
+        st.warning(f"Could not save the batch job for this session: {e}")
+
+def load_batch_job(session_key):
+    """
+    Load the pending Gemini batch job recorded for a session
+    
+    Args:
+        session_key: Key identifying the session
+        
+    Returns:
+        dict: The job saved with save_batch_job, or None if there is none
+    """
+    try:
+        return json.loads(batch_job_path(session_key).read_text(encoding='utf-8'))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        st.warning(f"Could not restore the batch job of this session: {e}")
+        return None
+
+def clear_batch_job(session_key):
+    """Forget the pending Gemini batch job of a session"""
+    try:
+        batch_job_path(session_key).unlink()
+    except FileNotFoundError:
+        pass
+
+@st.cache_data(show_spinner=False)
+def _read_snapshot(path, modified_time):
+    """Read a snapshot once for each time the file is written"""
+    import pyarrow.parquet as pq
+    
+    table = pq.read_table(path)
+    json_columns = json.loads((table.schema.metadata or {}).get(b'json_columns', b'[]'))
+    
+    matches = []
+    for row in table.to_pylist():
+        resume = {key: value for key, value in row.items() if value is not None}
+        for key in json_columns:
+            if isinstance(resume.get(key), str):
+                try:
+                    resume[key] = json.loads(resume[key])
+                except ValueError:
+                    pass
+        matches.append(resume)
+    return matches